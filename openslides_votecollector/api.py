@@ -1,11 +1,19 @@
-from xmlrpc.client import ServerProxy
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import zip_longest
+from xmlrpc.client import Fault, MultiCall, SafeTransport, ServerProxy, Transport
 
+from django.db import connection
 from django.utils.translation import ugettext as _
 from django.utils.translation import ugettext_noop
 
 from openslides.core.config import config
 
-from .models import Keypad
+from .cache import keypad_roster
+from .models import VoteCollector
 
 
 VOTECOLLECTOR_ERROR_MESSAGES = {
@@ -39,91 +47,534 @@ class VoteCollectorError(Exception):
         return repr("VoteCollector Exception: %s" % self.value)
 
 
-def get_server():
+class VoteCollectorConnectionError(VoteCollectorError):
     """
-    Gets a server proxy object.
+    Error class for failed connections to the VoteCollector. Only these
+    errors are counted by the circuit breaker.
     """
+    def __init__(self, value=None):
+        super().__init__(value or _('No connection to VoteCollector.'))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for the connection to the VoteCollector.
+
+    After failure_threshold consecutive connection errors the breaker opens
+    and all calls fail immediately for cooldown seconds. Then one call is
+    let through as probe (half-open). If it succeeds the breaker closes,
+    else it opens again.
+
+    Every receiver has its own breaker (see VoteCollectorClient). The
+    worst state of all receivers is stored in the VoteCollector object. A
+    closed breaker stores its state again at most every sync_interval
+    seconds, so that a new breaker (e. g. after a restart or in another
+    worker process) overwrites an outdated stored state.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    failure_threshold = 3
+    cooldown = 10
+    sync_interval = 10
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        # Time when the state was stored the last time.
+        self.synced_at = 0
+
+    def before_call(self):
+        """
+        Raises VoteCollectorConnectionError if the call is not allowed.
+        """
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self.opened_at + self.cooldown - time.time()
+            if self.state == self.HALF_OPEN or remaining > 0:
+                raise VoteCollectorConnectionError(
+                    _('No connection to VoteCollector. Retrying in %d seconds.') % max(remaining, 1))
+            state = self.state = self.HALF_OPEN
+        self.save_state(state)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            if self.state == self.CLOSED and time.time() - self.synced_at < self.sync_interval:
+                return
+            state = self.state = self.CLOSED
+        self.save_state(state)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.OPEN or (
+                    self.state == self.CLOSED and self.failures < self.failure_threshold):
+                return
+            state = self.state = self.OPEN
+            self.opened_at = time.time()
+        self.save_state(state)
+
+    def save_state(self, state):
+        self.synced_at = time.time()
+        save_connection_state()
+
+
+def save_connection_state():
+    """
+    Stores the worst breaker state of all receivers in the VoteCollector
+    object.
+    """
+    states = [client.breaker.state for client in clients]
+    for state in (CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN):
+        if state in states:
+            break
+    else:
+        state = CircuitBreaker.CLOSED
+    vc = VoteCollector.objects.get(id=1)
+    if vc.connection_state != state:
+        vc.connection_state = state
+        vc.save(update_fields=['connection_state'])
+
+
+class TimeoutTransportMixin:
+    """
+    Transport mixin which keeps the HTTP connection alive between requests
+    and uses separate timeouts for connecting and reading.
+    """
+    def __init__(self, connect_timeout, read_timeout, **kwargs):
+        super().__init__(**kwargs)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    def make_connection(self, host):
+        # The transport caches the connection to the last host, so we only
+        # have to connect if it is a new one.
+        connection = super().make_connection(host)
+        if connection.sock is None:
+            connection.timeout = self.connect_timeout
+            connection.connect()
+            connection.sock.settimeout(self.read_timeout)
+        return connection
+
+
+class TimeoutTransport(TimeoutTransportMixin, Transport):
+    pass
+
+
+class TimeoutSafeTransport(TimeoutTransportMixin, SafeTransport):
+    pass
+
+
+class VoteCollectorClient:
+    """
+    Thread safe pool of server proxies with persistent connections to one
+    VoteCollector and its circuit breaker. A proxy is used by one thread at
+    a time.
+    """
+    def __init__(self, uri, connect_timeout, read_timeout, size=4):
+        self.uri = uri
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.size = size
+        self.pool = queue.LifoQueue()
+        self.breaker = CircuitBreaker()
+        # Unknown until the first system.multicall request.
+        self.supports_multicall = None
+        # Fail early on invalid URIs.
+        self.pool.put(self.create_proxy())
+
+    def create_proxy(self):
+        transport_class = TimeoutSafeTransport if self.uri.startswith('https') else TimeoutTransport
+        transport = transport_class(self.connect_timeout, self.read_timeout)
+        return ServerProxy(self.uri, transport=transport)
+
+    @contextmanager
+    def server(self):
+        """
+        Context manager which lends a server proxy from the pool.
+        """
+        try:
+            proxy = self.pool.get_nowait()
+        except queue.Empty:
+            proxy = self.create_proxy()
+        try:
+            yield proxy
+        finally:
+            if self.pool.qsize() < self.size:
+                self.pool.put(proxy)
+            else:
+                proxy('close')()
+
+    def close(self):
+        while True:
+            try:
+                proxy = self.pool.get_nowait()
+            except queue.Empty:
+                break
+            proxy('close')()
+
+
+clients = ()
+client_lock = threading.Lock()
+executor = None
+
+# Config values which are replaced in this process only (see override_config()).
+config_overrides = {}
+
+
+def get_config(key):
+    """
+    Returns the value of the config variable unless it is overridden.
+    """
+    if key in config_overrides:
+        return config_overrides[key]
+    return config[key]
+
+
+@contextmanager
+def override_config(**values):
+    """
+    Context manager which replaces config variables like votecollector_uri
+    for this process without saving them, e. g. to use a fake VoteCollector
+    in the benchmark command.
+    """
+    config_overrides.update(values)
     try:
-        server = ServerProxy(config['votecollector_uri'])
-    except TypeError:
-        raise VoteCollectorError(_('Server not found.'))
-    return server
+        yield
+    finally:
+        for key in values:
+            config_overrides.pop(key, None)
 
 
-def get_keypads():
-    keypads = Keypad.objects.exclude(user__is_present=False).values_list(
-        'keypad_id', flat=True).order_by('keypad_id')
+def get_clients():
+    """
+    Returns a tuple with a client for each configured receiver. Several
+    receivers are configured by space separated URIs. The clients are
+    replaced if the URIs or the timeouts are changed.
+    """
+    global clients
+    uris = tuple(get_config('votecollector_uri').replace(',', ' ').split())
+    timeouts = (config['votecollector_connect_timeout'], config['votecollector_read_timeout'])
+    with client_lock:
+        if not clients or tuple(client.uri for client in clients) != uris or \
+                (clients[0].connect_timeout, clients[0].read_timeout) != timeouts:
+            if not uris:
+                raise VoteCollectorError(_('Server not found.'))
+            try:
+                new_clients = tuple(VoteCollectorClient(uri, *timeouts) for uri in uris)
+            except (AttributeError, OSError, TypeError):
+                raise VoteCollectorError(_('Server not found.'))
+            for client in clients:
+                client.close()
+            clients = new_clients
+    return clients
+
+
+def get_executor():
+    """
+    Returns the thread pool which sends the requests to several receivers
+    in parallel.
+    """
+    global executor
+    with client_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=8)
+    return executor
+
+
+def call_receivers(call, receivers=None, use_breaker=True):
+    """
+    Calls call(client, server, receiver) for the given receivers (default:
+    all). receiver is the index of the receiver. Several receivers are
+    called in parallel. Receivers with an open circuit breaker fail fast
+    unless use_breaker is False, e. g. to stop a voting in any case.
+
+    Returns a list of the results (None for failed calls) and a list of
+    the errors, which is empty if all calls succeeded.
+    """
+    clients = get_clients()
+    if receivers is None:
+        receivers = range(len(clients))
+
+    def run(receiver):
+        client = clients[receiver]
+        with client.server() as server:
+            return call(client, server, receiver)
+
+    # Futures or errors of the circuit breakers.
+    calls = []
+    for receiver in receivers:
+        try:
+            if use_breaker:
+                clients[receiver].breaker.before_call()
+        except VoteCollectorConnectionError as e:
+            calls.append(e)
+        else:
+            calls.append(receiver)
+    if len(calls) > 1:
+        calls = [item if isinstance(item, Exception) else get_executor().submit(run, item) for item in calls]
+
+    results = []
+    errors = []
+    for receiver, item in zip(receivers, calls):
+        if isinstance(item, Exception):
+            results.append(None)
+            errors.append(item)
+            continue
+        try:
+            # Do not bother the thread pool for a single receiver.
+            results.append(item.result() if len(calls) > 1 else run(item))
+        except Exception as e:
+            results.append(None)
+            errors.append(e)
+            if not isinstance(e, VoteCollectorError) or isinstance(e, VoteCollectorConnectionError):
+                clients[receiver].breaker.record_failure()
+            else:
+                # Errors returned by a VoteCollector are no connection failures.
+                clients[receiver].breaker.record_success()
+        else:
+            clients[receiver].breaker.record_success()
+    return results, errors
+
 
-    if config['votecollector_method'] == 'anonym':
-        keypads = keypads.filter(user=None)
-    elif config['votecollector_method'] == 'person':
-        keypads = keypads.exclude(user=None)
+def fan_out(call, receivers=None, use_breaker=True):
+    """
+    Like call_receivers() but raises the first error.
+    """
+    results, errors = call_receivers(call, receivers, use_breaker)
+    if errors:
+        raise errors[0]
+    return results
 
-    if not keypads.exists():
+
+def server_call(method, *args):
+    """
+    Returns a call for fan_out() which requests the given method of the
+    VoteCollector.
+    """
+    def call(client, server, receiver):
+        try:
+            return getattr(server.voteCollector, method)(*args)
+        except:
+            raise VoteCollectorConnectionError()
+    return call
+
+
+def get_keypads():
+    """
+    Returns a list of the keypad ids which are allowed to vote for each
+    receiver. The lists are taken from the in-memory roster (see cache.py).
+    """
+    keypads = keypad_roster.get(get_config('votecollector_method'), len(get_clients()))
+    if not any(keypads):
         raise VoteCollectorError(_('No keypads selected.'))
 
-    return keypads
+    return [list(ids) for ids in keypads]
 
 
-def get_device_status():
-    server = get_server()
-    try:
-        status = server.voteCollector.getDeviceStatus()
-    except:
-        raise VoteCollectorError(_('No connection to VoteCollector.'))
-    return status
+def join_device_statuses(statuses):
+    """
+    Returns the device status of several receivers joined.
+    """
+    return ' / '.join(statuses)
 
 
-def start_voting(mode, options, callback_url):
-    server = get_server()
-    keypads = get_keypads()
+def start_voting(mode, options, callback_url, stop=False, receivers=None):
+    """
+    Prepares and starts a voting on the given receivers (default: all) with
+    keypads and returns the number of keypads. If stop is True, an active
+    voting is stopped before.
 
+    stopVoting and prepareVoting are sent in one system.multicall request if
+    the VoteCollector supports it. Otherwise they are sent one by one.
+    startVoting is only sent if prepareVoting succeeded, else the device
+    would start the previously prepared voting. If a receiver fails, the
+    voting is stopped on the other ones.
+    """
+    keypads = get_keypads()
     ext_mode = options + ';' + callback_url if options else callback_url
-    try:
-        count = server.voteCollector.prepareVoting(mode + '-' + ext_mode, 0, 0, list(keypads))
-    except Exception as e:
-        raise VoteCollectorError(_('No connection to VoteCollector.'))
-    if count < 0:
-        raise VoteCollectorError(nr=count)
 
-    try:
-        count = server.voteCollector.startVoting()
-    except:
-        raise VoteCollectorError(_('No connection to VoteCollector.'))
-    if count < 0:
-        raise VoteCollectorError(nr=count)
+    def call(client, server, receiver):
+        prepare_args = (mode + '-' + ext_mode, 0, 0, keypads[receiver])
+        count = None
+        if client.supports_multicall is not False:
+            count = prepare_voting_multicall(client, server, prepare_args, stop)
 
-    return count
+        if count is None:
+            if stop:
+                try:
+                    server.voteCollector.stopVoting()
+                except:
+                    # Ignore errors like in stop_voting() called by the views.
+                    pass
+            try:
+                count = server.voteCollector.prepareVoting(*prepare_args)
+            except:
+                raise VoteCollectorConnectionError()
+        if count < 0:
+            raise VoteCollectorError(nr=count)
 
+        try:
+            count = server.voteCollector.startVoting()
+        except:
+            raise VoteCollectorConnectionError()
+        if count < 0:
+            raise VoteCollectorError(nr=count)
+        return count
 
-def stop_voting():
-    server = get_server()
-    try:
-        result = server.voteCollector.stopVoting()
-    except:
-        raise VoteCollectorError(_('No connection to VoteCollector.'))
-    return result
+    receivers = [
+        receiver for receiver, ids in enumerate(keypads) if ids and (receivers is None or receiver in receivers)]
+    if not receivers:
+        raise VoteCollectorError(_('No keypads selected.'))
+    counts, errors = call_receivers(call, receivers)
+    if errors:
+        started = [receiver for receiver, count in zip(receivers, counts) if count is not None]
+        if started:
+            call_receivers(server_call('stopVoting'), started, use_breaker=False)
+        raise errors[0]
+    return sum(counts)
 
 
-def get_voting_status():
+def prepare_voting_multicall(client, server, prepare_args, stop):
     """
-    Returns voting status as a list: [elapsed_seconds, votes_received]
+    Sends stopVoting (optional) and prepareVoting in one request. Returns
+    the result of prepareVoting or None if the VoteCollector does not
+    support system.multicall.
     """
-    server = get_server()
+    multicall = MultiCall(server)
+    if stop:
+        multicall.voteCollector.stopVoting()
+    multicall.voteCollector.prepareVoting(*prepare_args)
     try:
-        status = server.voteCollector.getVotingStatus()
+        results = multicall()
+    except Fault:
+        client.supports_multicall = False
+        return None
     except:
+        raise VoteCollectorConnectionError()
+    client.supports_multicall = True
+
+    # The result of stopVoting is ignored.
+    try:
+        return results[-1]
+    except Fault:
         raise VoteCollectorError(_('No connection to VoteCollector.'))
-    return status
 
 
-def get_voting_result():
+def stop_voting(receivers=None):
     """
-    Returns the voting result as a list.
+    Stops the voting on the given receivers (default: all) and returns the
+    number of received votes.
     """
-    server = get_server()
-    try:
-        result = server.voteCollector.getVotingResult()
-    except:
-        raise VoteCollectorError(_('No connection to VoteCollector.'))
-    return result
+    results = fan_out(server_call('stopVoting'), receivers, use_breaker=False)
+    return results[0] if len(results) == 1 else sum(results)
+
+
+def join_voting_statuses(statuses):
+    """
+    Returns the voting status of several receivers as a list:
+    [elapsed_seconds, votes_received]
+    """
+    if len(statuses) == 1:
+        return statuses[0]
+    return [max(status[0] for status in statuses), sum(status[1] for status in statuses)]
+
+
+def get_voting_result(receivers=None):
+    """
+    Returns the voting result of the given receivers (default: all) as a
+    list. The results of several receivers are added up.
+    """
+    results = fan_out(server_call('getVotingResult'), receivers)
+    if len(results) == 1:
+        return results[0]
+    return [sum(values) for values in zip_longest(*results, fillvalue=0)]
+
+
+class DevicePoller:
+    """
+    Background thread which samples the device and voting status of the
+    VoteCollector and keeps the latest snapshot, so that all browser tabs
+    share one request to the device.
+
+    The thread is started by the first reader and stops if nobody asked for
+    the snapshot for idle_timeout seconds.
+    """
+    idle_timeout = 60
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.snapshot = None
+        self.sampled = threading.Event()
+        self.last_access = 0
+
+    def get_snapshot(self):
+        """
+        Returns the latest snapshot as dictionary with the keys timestamp,
+        device_status, device_errors, device_error, voting_status,
+        voting_errors and voting_error. The statuses and errors are lists
+        with an entry per receiver (None for failed receivers and for
+        receivers without error). device_error and voting_error are set if
+        no receiver could be requested at all. Waits for the first sample
+        if the thread was not running.
+        """
+        with self.lock:
+            self.last_access = time.time()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='VoteCollectorPoller', daemon=True)
+                self.thread.start()
+        self.sampled.wait(config['votecollector_connect_timeout'] + config['votecollector_read_timeout'])
+        return self.snapshot
+
+    def run(self):
+        try:
+            while True:
+                self.sample()
+                with self.lock:
+                    if time.time() - self.last_access > self.idle_timeout:
+                        self.stopped()
+                        return
+                time.sleep(config['votecollector_poll_interval'] / 1000)
+        except:
+            with self.lock:
+                self.stopped()
+            raise
+        finally:
+            # The thread got its own database connection.
+            connection.close()
+
+    def stopped(self):
+        """
+        Drops the snapshot, so that the next reader starts the thread again
+        and waits for a fresh sample. Has to be called with self.lock held.
+        """
+        self.thread = None
+        self.snapshot = None
+        self.sampled.clear()
+
+    def sample(self):
+        snapshot = {'timestamp': time.time()}
+        for key, method in (('device', 'getDeviceStatus'), ('voting', 'getVotingStatus')):
+            snapshot[key + '_status'] = snapshot[key + '_errors'] = snapshot[key + '_error'] = None
+            try:
+                statuses, errors = call_receivers(server_call(method))
+            except VoteCollectorError as e:
+                snapshot[key + '_error'] = e.value
+                continue
+            # The errors are in the order of the failed receivers.
+            errors = iter(errors)
+            snapshot[key + '_status'] = statuses
+            snapshot[key + '_errors'] = [
+                getattr(next(errors), 'value', _('No connection to VoteCollector.')) if status is None else None
+                for status in statuses]
+        self.snapshot = snapshot
+        self.sampled.set()
+
+
+device_poller = DevicePoller()
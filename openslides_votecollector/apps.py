@@ -28,14 +28,23 @@ class VoteCollectorAppConfig(AppConfig):
 
     def ready(self):
         # Import all required stuff.
+        from django.db.models.signals import post_delete, post_save
+        from openslides.assignments.models import AssignmentOption
         from openslides.core.config import config
         from openslides.core.signals import post_permission_creation
+        from openslides.users.models import User
         from openslides.utils.rest_api import router
         from .config_variables import get_config_variables
         from .projector import get_projector_elements
         from .signals import (
             add_default_seating_plan,
-            add_permissions_to_builtin_groups
+            add_permissions_to_builtin_groups,
+            invalidate_candidate_index,
+            invalidate_seating_plan_snapshot,
+            update_keypad_roster_on_keypad_delete,
+            update_keypad_roster_on_keypad_save,
+            update_keypad_roster_on_user_delete,
+            update_keypad_roster_on_user_save
         )
         from .urls import urlpatterns
         from .views import (
@@ -59,6 +68,47 @@ class VoteCollectorAppConfig(AppConfig):
             add_default_seating_plan,
             dispatch_uid='votecollector_add_default_seating_plan'
         )
+        post_save.connect(
+            invalidate_candidate_index,
+            sender=AssignmentOption,
+            dispatch_uid='votecollector_invalidate_candidate_index_on_save'
+        )
+        post_delete.connect(
+            invalidate_candidate_index,
+            sender=AssignmentOption,
+            dispatch_uid='votecollector_invalidate_candidate_index_on_delete'
+        )
+        post_save.connect(
+            update_keypad_roster_on_keypad_save,
+            sender=self.get_model('Keypad'),
+            dispatch_uid='votecollector_update_keypad_roster_on_keypad_save'
+        )
+        post_delete.connect(
+            update_keypad_roster_on_keypad_delete,
+            sender=self.get_model('Keypad'),
+            dispatch_uid='votecollector_update_keypad_roster_on_keypad_delete'
+        )
+        post_save.connect(
+            update_keypad_roster_on_user_save,
+            sender=User,
+            dispatch_uid='votecollector_update_keypad_roster_on_user_save'
+        )
+        post_delete.connect(
+            update_keypad_roster_on_user_delete,
+            sender=User,
+            dispatch_uid='votecollector_update_keypad_roster_on_user_delete'
+        )
+        for model in (self.get_model('Seat'), self.get_model('Keypad'), User):
+            post_save.connect(
+                invalidate_seating_plan_snapshot,
+                sender=model,
+                dispatch_uid='votecollector_invalidate_seating_plan_snapshot_on_save_%s' % model.__name__
+            )
+            post_delete.connect(
+                invalidate_seating_plan_snapshot,
+                sender=model,
+                dispatch_uid='votecollector_invalidate_seating_plan_snapshot_on_delete_%s' % model.__name__
+            )
 
         # Register viewsets.
         router.register(self.get_model('VoteCollector').get_collection_string(), VotecollectorViewSet)
@@ -0,0 +1,167 @@
+from django.db import transaction
+
+from openslides.core.config import config
+from openslides.utils.autoupdate import inform_changed_data
+
+from .cache import seating_plan_snapshot
+from .models import Keypad, VoteCollector
+from .tally import get_poll_tally
+from .utils import WriteBehindBuffer, bulk_update
+
+
+class KeypadTelemetryBuffer(WriteBehindBuffer):
+    """
+    Collects the latest battery level of all keypads which reported to the
+    votecollector and marks them as in range with one bulk update.
+
+    This keeps the keypad rows out of the vote transactions. The buffer is
+    keyed by the keypad_id of the device, so unknown keypads are dropped
+    silently during flush.
+    """
+    def __init__(self, interval=None):
+        super().__init__(interval)
+        self.battery_levels = {}
+
+    def add(self, keypad_id, battery_level):
+        try:
+            battery_level = int(battery_level)
+        except (TypeError, ValueError):
+            battery_level = -1
+        with self.lock:
+            self.battery_levels[int(keypad_id)] = battery_level
+            self.schedule()
+
+    def discard(self):
+        """
+        Drops all pending data, e. g. if all keypads are reset.
+        """
+        with self.lock:
+            self.battery_levels = {}
+            self.cancel()
+
+    def flush(self):
+        with self.lock:
+            battery_levels, self.battery_levels = self.battery_levels, {}
+            self.cancel()
+        if not battery_levels:
+            return
+
+        keypads = list(Keypad.objects.filter(keypad_id__in=battery_levels.keys()))
+        for keypad in keypads:
+            keypad.in_range = True
+            keypad.battery_level = battery_levels[keypad.keypad_id]
+        bulk_update(Keypad, keypads, ('in_range', 'battery_level'))
+        seating_plan_snapshot.invalidate()
+
+        # Trigger one auto update for all keypads.
+        inform_changed_data(keypads)
+
+
+class VotingProgressBuffer(WriteBehindBuffer):
+    """
+    Keeps the number of received votes and the voting duration reported by
+    the single vote callbacks in memory and writes them to the VoteCollector
+    object of their room a few times per second, together with the live
+    tally of every room. The live tally is counted by the database, so that
+    it includes the votes written by all processes.
+
+    Without it every keypress would lock the VoteCollector row and trigger
+    an auto update.
+    """
+    interval = 0.25
+
+    def __init__(self, interval=None):
+        super().__init__(interval)
+        # (votes_received, voting_duration) tuples by room (VoteCollector id).
+        self.progress = {}
+        self.latest = {}
+
+    def add(self, room_id, votes_received, voting_duration):
+        try:
+            progress = (int(votes_received), int(voting_duration))
+        except (TypeError, ValueError):
+            return
+        with self.lock:
+            self.progress[room_id] = self.latest[room_id] = progress
+            self.schedule()
+
+    def touch(self):
+        """
+        Schedules writing the changed live tallies.
+        """
+        with self.lock:
+            self.schedule()
+
+    def get(self, room_id):
+        """
+        Returns the latest (votes_received, voting_duration) tuple reported
+        to this process during the current voting of the room or None.
+        """
+        with self.lock:
+            return self.latest.get(room_id)
+
+    def discard(self, room_id):
+        with self.lock:
+            self.progress.pop(room_id, None)
+            self.latest.pop(room_id, None)
+
+    def flush(self):
+        with self.lock:
+            progress, self.progress = self.progress, {}
+            self.cancel()
+
+        # There are only a few rooms, so all of them are loaded at once.
+        for vc in VoteCollector.objects.all():
+            update_fields = []
+            if vc.pk in progress:
+                vc.votes_received, vc.voting_duration = progress[vc.pk]
+                update_fields.extend(['votes_received', 'voting_duration'])
+            tally = get_poll_tally(vc.voting_mode, vc.voting_target)
+            if tally is not None and tally != vc.live_tally:
+                vc.live_tally = tally
+                update_fields.append('live_tally')
+            if update_fields:
+                vc.save(update_fields=update_fields)
+
+
+class AutoupdateBuffer(WriteBehindBuffer):
+    """
+    Collects changed instances during a voting and informs all clients and
+    projectors about them with one auto update per tick (config variable
+    votecollector_autoupdate_interval). Only the latest version of each
+    instance is sent.
+
+    Call flush() to send all pending instances synchronously, e. g. when a
+    voting stops.
+    """
+    def __init__(self, interval=None):
+        super().__init__(interval)
+        self.instances = {}
+
+    def get_interval(self):
+        return config['votecollector_autoupdate_interval'] / 1000
+
+    def add(self, instances):
+        """
+        Adds the instances after the current transaction is committed.
+        """
+        instances = list(instances)
+
+        def add_instances():
+            with self.lock:
+                for instance in instances:
+                    self.instances[(instance.get_collection_string(), instance.pk)] = instance
+                self.schedule()
+        transaction.on_commit(add_instances)
+
+    def flush(self):
+        with self.lock:
+            instances, self.instances = self.instances, {}
+            self.cancel()
+        if instances:
+            inform_changed_data(list(instances.values()))
+
+
+autoupdate_buffer = AutoupdateBuffer()
+keypad_telemetry = KeypadTelemetryBuffer()
+voting_progress = VotingProgressBuffer()
@@ -0,0 +1,399 @@
+import threading
+import time
+from array import array
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from openslides.assignments.models import AssignmentOption
+from openslides.users.models import User
+
+from .models import Keypad, Seat
+
+
+class SharedVersionMixin:
+    """
+    Mixin for in-memory caches of several worker processes. Every change
+    publishes a new version in the Django cache. Other processes drop their
+    data if they see a new version, which they check at most once per
+    check_interval. This needs a cache which is shared by all processes
+    (e. g. Redis) if OpenSlides runs with several workers.
+
+    Subclasses set version_key and hold self.lock while calling
+    version_changed() and publish().
+    """
+    version_key = None
+    check_interval = 1
+
+    # Version of the data and time of the last version check.
+    version = None
+    checked_at = 0
+
+    def version_changed(self):
+        """
+        Returns True if another process published a new version since the
+        last check.
+        """
+        now = time.time()
+        if now - self.checked_at < self.check_interval:
+            return False
+        self.checked_at = now
+        version = cache.get(self.version_key)
+        if version == self.version:
+            return False
+        self.version = version
+        return True
+
+    def publish(self):
+        """
+        Publishes a new version of the data to the other processes.
+        """
+        self.version = uuid4().hex
+        cache.set(self.version_key, self.version, None)
+
+
+class CandidateIndex(SharedVersionMixin):
+    """
+    In-memory index which maps the keys of a keypad to the candidates of an
+    assignment poll. Key 1 is the option with the lowest weight, key 0 means
+    abstention.
+
+    The index of a poll is built when an election starts and dropped when
+    the options of the poll change (see signals.py), also in the other
+    processes.
+    """
+    version_key = 'votecollector_candidate_index_version'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.polls = {}
+
+    def set(self, poll_id, candidate_ids, publish=True):
+        """
+        Stores the candidate ids of the poll ordered by option weight. The
+        other processes rebuild their index of the poll unless publish is
+        False.
+        """
+        candidate_ids = tuple(candidate_ids)
+        with self.lock:
+            if publish:
+                self.publish()
+            self.polls[int(poll_id)] = candidate_ids
+        return candidate_ids
+
+    def build(self, poll_id):
+        """
+        Loads the candidate ids of the poll from the database.
+        """
+        return self.set(poll_id, AssignmentOption.objects.filter(poll_id=poll_id).order_by(
+            'weight').values_list('candidate_id', flat=True), publish=False)
+
+    def get(self, poll_id):
+        """
+        Returns the ordered candidate ids of the poll. Builds the index if
+        it does not exist yet or was changed by another process.
+        """
+        with self.lock:
+            if self.version_changed():
+                self.polls = {}
+            candidate_ids = self.polls.get(int(poll_id))
+        if candidate_ids is None:
+            candidate_ids = self.build(poll_id)
+        return candidate_ids
+
+    def get_candidate_id(self, poll_id, key):
+        """
+        Returns the candidate id for the key or None if the key does not
+        select a candidate (abstention or unknown candidate number).
+        """
+        candidate_ids = self.get(poll_id)
+        if 0 < key <= len(candidate_ids):
+            return candidate_ids[key - 1]
+        return None
+
+    def invalidate(self, poll_id):
+        with self.lock:
+            self.polls.pop(int(poll_id), None)
+            self.publish()
+
+
+candidate_index = CandidateIndex()
+
+
+class ConnectionIndex:
+    """
+    In-memory index of the connection ids of the keypads in the active
+    poll. The ids are held in a compact array indexed by a dense slot per
+    keypad, so that the votes of keypads which voted before are updated
+    without a query on databases without upsert (see votes.py).
+
+    The index is loaded when a voting starts and kept after the voting
+    stopped until the next one starts. The ids may be outdated, e. g. if
+    another process cleared the votes of the poll. The writer checks the
+    number of updated rows and loads the connections again then.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset(None, None, ())
+
+    def reset(self, conn_model, poll_id, keypad_ids):
+        """
+        Clears the index. Has to be called with self.lock held.
+        """
+        self.conn_model = conn_model
+        self.poll_id = int(poll_id) if poll_id is not None else None
+        self.slots = {keypad_id: slot for slot, keypad_id in enumerate(keypad_ids)}
+        # Connection id per slot, 0 means no connection.
+        self.connections = array('q', [0]) * len(self.slots)
+
+    def get_slot(self, keypad_id):
+        """
+        Returns the slot of the keypad. Keypads added during the voting get
+        a new slot. Has to be called with self.lock held.
+        """
+        slot = self.slots.get(keypad_id)
+        if slot is None:
+            slot = self.slots[keypad_id] = len(self.connections)
+            self.connections.append(0)
+        return slot
+
+    def start(self, conn_model, poll_id):
+        """
+        Starts an index for the poll. All keypads and existing connections
+        are loaded with one query each.
+        """
+        keypad_ids = Keypad.objects.order_by('pk').values_list('pk', flat=True)
+        connections = conn_model.objects.filter(poll_id=poll_id).exclude(keypad=None).values_list('keypad_id', 'pk')
+        with self.lock:
+            self.reset(conn_model, poll_id, keypad_ids)
+            for keypad_id, connection_id in connections:
+                self.connections[self.get_slot(keypad_id)] = connection_id
+
+    def stop(self):
+        with self.lock:
+            self.reset(None, None, ())
+
+    def is_active(self, conn_model, poll_id):
+        return self.conn_model is conn_model and self.poll_id == int(poll_id)
+
+    def add(self, conn_model, poll_id, connections):
+        """
+        Stores the given (keypad id, connection id) tuples if the poll is
+        indexed.
+        """
+        with self.lock:
+            if not self.is_active(conn_model, poll_id):
+                return
+            for keypad_id, connection_id in connections:
+                self.connections[self.get_slot(keypad_id)] = connection_id
+
+    def get_connection_ids(self, conn_model, poll_id, keypad_ids):
+        """
+        Returns a dict of the connection ids of the given keypads, 0 for
+        keypads without a vote. Returns None if the poll is not indexed.
+        """
+        with self.lock:
+            if not self.is_active(conn_model, poll_id):
+                return None
+            return {keypad_id: self.connections[self.get_slot(keypad_id)] for keypad_id in keypad_ids}
+
+
+connection_index = ConnectionIndex()
+
+
+class SeatingPlanSnapshot(SharedVersionMixin):
+    """
+    In-memory snapshot of all seats, keypads and the users of the keypads
+    which are required by the poll slides if the seating plan is shown.
+
+    The snapshot is rebuilt lazily after a seat, keypad or user has changed
+    (see signals.py), also in the other processes. Bulk updates of keypads
+    have to call invalidate() explicitly.
+    """
+    version_key = 'votecollector_seating_plan_version'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.instances = None
+        # Local counter of invalidations.
+        self.generation = 0
+
+    def get(self):
+        """
+        Returns a tuple of all seats, keypads and keypad users. Uses a fixed
+        number of queries if the snapshot has to be rebuilt.
+        """
+        with self.lock:
+            if self.version_changed():
+                self.instances = None
+                self.generation += 1
+            instances = self.instances
+            generation = self.generation
+        if instances is None:
+            # The serializers access the keypad of a seat and the groups of a user.
+            seats = list(Seat.objects.select_related('keypad'))
+            keypads = list(Keypad.objects.select_related('user').prefetch_related('user__groups'))
+            users = [keypad.user for keypad in keypads if keypad.user is not None]
+            instances = tuple(seats + keypads + users)
+            with self.lock:
+                # Do not store the snapshot if it was invalidated meanwhile.
+                if generation == self.generation:
+                    self.instances = instances
+        return instances
+
+    def invalidate(self):
+        with self.lock:
+            self.instances = None
+            self.generation += 1
+            self.publish()
+
+
+seating_plan_snapshot = SeatingPlanSnapshot()
+
+
+class KeypadRoster(SharedVersionMixin):
+    """
+    In-memory roster of the keypads which are allowed to vote for each
+    distribution method (anonym, person or both), split by receivers.
+    Keypads of absent users are not allowed to vote.
+
+    The roster is loaded with two queries and then updated incrementally if
+    a keypad or the presence of a user changes (see signals.py). Bulk
+    creates or updates of keypads have to call invalidate() explicitly.
+    Other processes drop their roster on every change.
+    """
+    version_key = 'votecollector_keypad_roster_version'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Map of keypad database ids to tuples of device keypad id, user id
+        # and receiver.
+        self.keypads = None
+        # Map of user ids to their presence.
+        self.presence = None
+        # Map of device keypad ids to keypad database ids, built on demand.
+        self.pks = None
+        # Sorted device keypad ids per method and receiver, built from the
+        # maps above.
+        self.rosters = {}
+
+    def load(self):
+        """
+        Loads all keypads and the presence of all users. Has to be called
+        with self.lock held.
+        """
+        self.keypads = dict(
+            (pk, (keypad_id, user_id, receiver))
+            for pk, keypad_id, user_id, receiver in Keypad.objects.values_list(
+                'pk', 'keypad_id', 'user_id', 'receiver'))
+        self.presence = dict(User.objects.values_list('pk', 'is_present'))
+        self.pks = None
+        self.rosters = {}
+
+    def reset(self):
+        """
+        Drops the roster. Has to be called with self.lock held.
+        """
+        self.keypads = None
+        self.presence = None
+        self.pks = None
+        self.rosters = {}
+
+    def check_version(self):
+        """
+        Drops the roster if another process changed it. Has to be called
+        with self.lock held.
+        """
+        if self.version_changed():
+            self.reset()
+
+    def get(self, method, receivers=1):
+        """
+        Returns a list with a sorted tuple of device keypad ids for each of
+        the given number of receivers. These keypads are allowed to vote
+        with the given method. Keypads of unknown receivers are assigned to
+        the first one.
+        """
+        with self.lock:
+            self.check_version()
+            if self.keypads is None:
+                self.load()
+            roster = self.rosters.get((method, receivers))
+            if roster is None:
+                roster = [[] for i in range(receivers)]
+                for keypad_id, user_id, receiver in self.keypads.values():
+                    if user_id is None:
+                        if method == 'person':
+                            continue
+                    elif method == 'anonym' or not self.presence.get(user_id, True):
+                        continue
+                    roster[receiver - 1 if 0 < receiver <= receivers else 0].append(keypad_id)
+                roster = self.rosters[(method, receivers)] = [tuple(sorted(ids)) for ids in roster]
+        return roster
+
+    def get_keypad_pk(self, keypad_id):
+        """
+        Returns the database id of the keypad with the given device keypad
+        id or None if it is not registered. Uses no query once the roster
+        is loaded, except for unknown keypads which may have been registered
+        by another process.
+        """
+        with self.lock:
+            self.check_version()
+            if self.keypads is None:
+                self.load()
+            if self.pks is None:
+                self.pks = dict((entry[0], pk) for pk, entry in self.keypads.items())
+            keypad_pk = self.pks.get(keypad_id)
+        if keypad_pk is None:
+            keypad = Keypad.objects.filter(keypad_id=keypad_id).only('keypad_id', 'user_id', 'receiver').first()
+            if keypad is not None:
+                with self.lock:
+                    if self.keypads is not None:
+                        self.keypads[keypad.pk] = (keypad.keypad_id, keypad.user_id, keypad.receiver)
+                        self.pks = None
+                        self.rosters = {}
+                keypad_pk = keypad.pk
+        return keypad_pk
+
+    def update_keypad(self, keypad):
+        with self.lock:
+            entry = (keypad.keypad_id, keypad.user_id, keypad.receiver)
+            if self.keypads is None or self.keypads.get(keypad.pk) != entry:
+                if self.keypads is not None:
+                    self.keypads[keypad.pk] = entry
+                    self.pks = None
+                    self.rosters = {}
+                self.publish()
+
+    def remove_keypad(self, keypad):
+        with self.lock:
+            if self.keypads is not None:
+                self.keypads.pop(keypad.pk, None)
+                self.pks = None
+                self.rosters = {}
+            self.publish()
+
+    def update_user(self, user):
+        with self.lock:
+            if self.presence is None or self.presence.get(user.pk) != user.is_present:
+                if self.presence is not None:
+                    self.presence[user.pk] = user.is_present
+                    # Only the rosters of personalized keypads depend on the presence.
+                    self.rosters = dict(
+                        (key, roster) for key, roster in self.rosters.items() if key[0] == 'anonym')
+                self.publish()
+
+    def remove_user(self, user):
+        with self.lock:
+            if self.presence is not None:
+                self.presence.pop(user.pk, None)
+            self.publish()
+
+    def invalidate(self):
+        with self.lock:
+            self.reset()
+            self.publish()
+
+
+keypad_roster = KeypadRoster()
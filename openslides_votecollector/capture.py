@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+
+
+class TrafficRecorder:
+    """
+    Writes every device callback to an append-only file with one JSON
+    object per line:
+
+    {"t": arrival time, "d": duration in seconds, "path": "/votecollector/...",
+     "type": content type, "body": request body}
+
+    Capturing is enabled by the setting VOTECOLLECTOR_CAPTURE_FILE which
+    holds the path of the file. Several worker processes may append to the
+    same file. See replay.py to send a captured file again.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.path = None
+        self.fd = None
+
+    def get_fd(self):
+        """
+        Returns the file descriptor of the capture file or None if
+        capturing is disabled.
+        """
+        path = getattr(settings, 'VOTECOLLECTOR_CAPTURE_FILE', None)
+        if path == self.path:
+            return self.fd
+        with self.lock:
+            if path != self.path:
+                if self.fd is not None:
+                    os.close(self.fd)
+                self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600) if path else None
+                self.path = path
+        return self.fd
+
+    def record(self, request, arrival, duration):
+        fd = self.get_fd()
+        if fd is None:
+            return
+        line = json.dumps({
+            't': round(arrival, 6),
+            'd': round(duration, 6),
+            'path': request.path,
+            'type': request.META.get('CONTENT_TYPE', ''),
+            'body': request.body.decode('utf-8', 'replace'),
+        }, separators=(',', ':')) + '\n'
+        # One write per line keeps the lines of several processes apart.
+        os.write(fd, line.encode('utf-8'))
+
+
+traffic_recorder = TrafficRecorder()
+
+
+def capture_callback(view):
+    """
+    Decorator for the callback views of the VoteCollector which records all
+    requests if capturing is enabled.
+    """
+    @wraps(view)
+    def wrapped_view(request, *args, **kwargs):
+        if traffic_recorder.get_fd() is None:
+            return view(request, *args, **kwargs)
+        # Read the body before the view parses it.
+        request.body
+        arrival = time.time()
+        start = time.perf_counter()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            traffic_recorder.record(request, arrival, time.perf_counter() - start)
+    return wrapped_view
@@ -25,10 +25,45 @@ def get_config_variables():
         name='votecollector_uri',
         default_value='http://localhost:8030',
         label='URL of VoteCollector',
-        help_text='Example: http://localhost:8030',
+        help_text='Example: http://localhost:8030. Separate the URLs of several receivers by spaces.',
         weight=620,
         group='VoteCollector'
     )
+    yield ConfigVariable(
+        name='votecollector_connect_timeout',
+        default_value=3,
+        input_type='integer',
+        label='Connect timeout for VoteCollector (seconds)',
+        weight=622,
+        group='VoteCollector'
+    )
+    yield ConfigVariable(
+        name='votecollector_read_timeout',
+        default_value=10,
+        input_type='integer',
+        label='Read timeout for VoteCollector (seconds)',
+        help_text='Maximum time to wait for an answer of the VoteCollector.',
+        weight=624,
+        group='VoteCollector'
+    )
+    yield ConfigVariable(
+        name='votecollector_poll_interval',
+        default_value=1000,
+        input_type='integer',
+        label='Status polling interval for VoteCollector (milliseconds)',
+        help_text='The device and voting status is requested once per interval for all users.',
+        weight=626,
+        group='VoteCollector'
+    )
+    yield ConfigVariable(
+        name='votecollector_autoupdate_interval',
+        default_value=200,
+        input_type='integer',
+        label='Update interval for incoming votes (milliseconds)',
+        help_text='Incoming votes are sent to clients and projectors in one update per interval.',
+        weight=628,
+        group='VoteCollector'
+    )
     yield ConfigVariable(
         name='votecollector_vote_started_msg',
         default_value=ugettext_noop('Please vote now!'),
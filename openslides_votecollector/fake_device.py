@@ -0,0 +1,226 @@
+"""
+Local stand-in for the VoteCollector software. It implements the XML-RPC
+interface used by api.py and simulates the key presses of the keypads
+which were given to prepareVoting. It is used by the benchmark command
+(see management/commands/votecollector_benchmark.py) and can be run on its
+own against a running OpenSlides server:
+
+    python -m openslides_votecollector.fake_device --port 8030 --rate 50
+
+This module only uses the standard library.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from itertools import islice
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode
+from urllib.request import urlopen
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+# Voting modes and the keys which can be pressed.
+KEYS = {
+    'YesNoAbstain': ('Y', 'N', 'A'),
+    'SpeakerList': ('Y', 'N'),
+    'Ping': (),
+}
+
+
+class RequestHandler(SimpleXMLRPCRequestHandler):
+    # Keep the connection alive like the VoteCollector does.
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+class FakeVoteCollector:
+    """
+    XML-RPC server with the methods of the VoteCollector. All votings are
+    simulated, the key presses are generated by keypresses().
+    """
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = ThreadingXMLRPCServer(
+            (host, port), requestHandler=RequestHandler, logRequests=False, allow_none=True)
+        self.server.register_multicall_functions()
+        for name in ('getDeviceStatus', 'prepareVoting', 'startVoting', 'stopVoting',
+                     'getVotingStatus', 'getVotingResult'):
+            self.server.register_function(getattr(self, name), 'voteCollector.' + name)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.mode = None
+        self.options = None
+        self.callback_url = None
+        self.keypads = []
+        self.started = None
+        self.votes = {}
+
+    @property
+    def uri(self):
+        host, port = self.server.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='FakeVoteCollector', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.server.shutdown()
+            self.thread = None
+        self.server.server_close()
+
+    # XML-RPC methods
+
+    def getDeviceStatus(self):
+        return 'Device: Simulation, %d keypads' % len(self.keypads)
+
+    def prepareVoting(self, ext_mode, first_keypad, last_keypad, keypads):
+        """
+        ext_mode is '<mode>-<options>;<callback url>' or '<mode>-<callback url>'.
+        """
+        mode, ext = ext_mode.split('-', 1)
+        options, __, callback_url = ext.rpartition(';')
+        if mode not in KEYS and mode not in ('SingleDigit', 'MultiDigit'):
+            return -1
+        if not keypads:
+            return -4
+        with self.lock:
+            self.mode = mode
+            self.options = int(options) if options else 0
+            self.callback_url = callback_url
+            self.keypads = list(keypads)
+            self.started = None
+            self.votes = {}
+        return len(keypads)
+
+    def startVoting(self):
+        with self.lock:
+            if self.mode is None:
+                return -8
+            self.started = time.time()
+            return len(self.keypads)
+
+    def stopVoting(self):
+        with self.lock:
+            self.started = None
+            return len(self.votes)
+
+    def getVotingStatus(self):
+        with self.lock:
+            elapsed = int(time.time() - self.started) if self.started else 0
+            return [elapsed, len(self.votes)]
+
+    def getVotingResult(self):
+        with self.lock:
+            values = list(self.votes.values())
+        return [values.count('Y'), values.count('N'), values.count('A')]
+
+    # Simulation
+
+    def get_keys(self):
+        if self.mode in ('SingleDigit', 'MultiDigit'):
+            # Candidate numbers and 0 for abstention.
+            return [str(key) for key in range(self.options + 1)]
+        return KEYS[self.mode]
+
+    def keypresses(self, count, seed=None):
+        """
+        Generator of count (keypad id, key) tuples of random keypads of the
+        current voting. Keypads may change their votes. In ping mode the key
+        is None.
+        """
+        rand = random.Random(seed)
+        keys = self.get_keys()
+        for i in range(count):
+            keypad_id = rand.choice(self.keypads)
+            key = rand.choice(keys) if keys else None
+            if key is not None:
+                with self.lock:
+                    self.votes[keypad_id] = key
+            yield keypad_id, key
+
+    def get_vote_data(self, keypad_id, key):
+        """
+        Returns the POST data of a single key press callback.
+        """
+        with self.lock:
+            elapsed = int(time.time() - self.started) if self.started else 0
+            votes = len(self.votes)
+        data = {'battery': random.randint(0, 100)}
+        if key is not None:
+            data.update({'value': key, 'sn': '%08d' % keypad_id, 'votes': votes, 'elapsed': elapsed})
+        return data
+
+    @staticmethod
+    def get_batch_data(keypresses):
+        """
+        Returns the JSON body of a batch callback.
+        """
+        votes = []
+        for keypad_id, key in keypresses:
+            vote = {'id': keypad_id, 'bl': random.randint(0, 100)}
+            if key is not None:
+                vote.update({'value': key, 'sn': '%08d' % keypad_id})
+            votes.append(vote)
+        return json.dumps(votes)
+
+
+def run_http(device, count, rate, batch_size):
+    """
+    Sends count simulated key presses to the callback URL of the current
+    voting, rate key presses per second (0 = as fast as possible). Key
+    presses are sent one by one if batch_size is 0, else in batches.
+    """
+    interval = batch_size / rate if rate and batch_size else (1 / rate if rate else 0)
+    keypresses = device.keypresses(count)
+    next_time = time.time()
+    sent = 0
+    while sent < count:
+        if batch_size:
+            batch = list(islice(keypresses, batch_size))
+            urlopen(device.callback_url, device.get_batch_data(batch).encode('utf-8')).read()
+            sent += len(batch)
+        else:
+            keypad_id, key = next(keypresses)
+            data = urlencode(device.get_vote_data(keypad_id, key)).encode('utf-8')
+            urlopen('%s%d/' % (device.callback_url, keypad_id), data).read()
+            sent += 1
+        next_time += interval
+        time.sleep(max(next_time - time.time(), 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulated VoteCollector device.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8030)
+    parser.add_argument('--rate', type=float, default=10, help='Key presses per second (0 = no limit).')
+    parser.add_argument('--batch', type=int, default=0, help='Send key presses in batches of this size.')
+    parser.add_argument('--count', type=int, default=1000, help='Key presses per voting.')
+    args = parser.parse_args()
+
+    device = FakeVoteCollector(args.host, args.port)
+    device.start()
+    print('Fake VoteCollector listening on %s' % device.uri)
+    started = None
+    try:
+        while True:
+            # Simulate key presses for every new voting started by OpenSlides.
+            if device.started and device.started != started:
+                started = device.started
+                print('Voting started: %s %s' % (device.mode, device.callback_url))
+                run_http(device, args.count, args.rate, args.batch)
+                print('%d key presses sent.' % args.count)
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        device.stop()
+
+
+if __name__ == '__main__':
+    main()
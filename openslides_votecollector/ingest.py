@@ -0,0 +1,162 @@
+import logging
+import queue
+import threading
+import time
+
+from django.db import connection
+
+from .buffers import voting_progress
+from .journal import store_votes, vote_journal
+from .votes import apply_entries
+
+logger = logging.getLogger(__name__)
+
+
+class VoteQueue:
+    """
+    In-process queue for the votes of the single vote callbacks. The
+    callback is answered as soon as the vote is queued. A small pool of
+    workers writes the votes to the database in micro batches with bulk
+    queries.
+
+    Votes are assigned to the workers by keypad, so that the votes of one
+    keypad are written in order. Queued votes are lost if the process
+    stops. Enable the vote journal (see journal.py) if acknowledged votes
+    have to survive a restart.
+
+    get_status() returns the number of waiting votes and the age of the
+    oldest one. A warning is logged if the database falls behind.
+    """
+    workers = 4
+    batch_size = 500
+    batch_interval = 0.02
+    # Seconds a vote may wait before a warning is logged.
+    max_age = 5
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.has_written = threading.Condition(self.lock)
+        self.queues = None
+        # Time when the oldest vote of the current batch of each worker was
+        # queued, or None if the worker is idle.
+        self.busy_since = []
+        # Counts of queued and written votes.
+        self.queued = 0
+        self.written = 0
+
+    def start(self):
+        """
+        Starts the workers. Has to be called with self.lock held.
+        """
+        if self.queues is not None:
+            return
+        self.queues = [queue.Queue() for i in range(self.workers)]
+        self.busy_since = [None] * self.workers
+        for index in range(self.workers):
+            threading.Thread(
+                target=self.run_worker, args=(index,), name='VoteQueueWorker-%d' % index, daemon=True).start()
+
+    def put(self, entries):
+        """
+        Queues the entries. Every entry is a vote with the voting mode and
+        the poll id (see votes.apply_entries).
+        """
+        now = time.time()
+        with self.lock:
+            self.start()
+            self.queued += len(entries)
+        for entry in entries:
+            self.queues[entry['keypad'] % self.workers].put((now, entry))
+
+    def get_status(self):
+        """
+        Returns a dict with the number of votes which are not written yet
+        (depth), the seconds the oldest of them waits (age) and the number
+        of written votes.
+        """
+        now = time.time()
+        with self.lock:
+            if self.queues is None:
+                return {'depth': 0, 'age': 0, 'written': 0}
+            oldest = [since for since in self.busy_since if since is not None]
+            depth = self.queued - self.written
+            written = self.written
+        for worker_queue in self.queues:
+            with worker_queue.mutex:
+                if worker_queue.queue:
+                    oldest.append(worker_queue.queue[0][0])
+        return {
+            'depth': depth,
+            'age': round(now - min(oldest), 3) if oldest else 0,
+            'written': written,
+        }
+
+    def drain(self, timeout=5):
+        """
+        Waits until all queued votes are written, e. g. when a voting stops.
+        """
+        deadline = time.time() + timeout
+        with self.lock:
+            while self.written < self.queued and time.time() < deadline:
+                self.has_written.wait(max(deadline - time.time(), 0))
+
+    def run_worker(self, index):
+        worker_queue = self.queues[index]
+        while True:
+            queued_at, entry = worker_queue.get()
+            with self.lock:
+                self.busy_since[index] = queued_at
+            entries = [entry]
+            deadline = time.time() + self.batch_interval
+            while len(entries) < self.batch_size:
+                try:
+                    entries.append(worker_queue.get(timeout=max(deadline - time.time(), 0))[1])
+                except queue.Empty:
+                    break
+            self.write(entries)
+            age = time.time() - queued_at
+            if age > self.max_age:
+                logger.warning('Votes waited %.1f seconds in the vote queue (%d waiting).' % (
+                    age, self.get_status()['depth']))
+            with self.lock:
+                self.busy_since[index] = None
+                self.written += len(entries)
+                self.has_written.notify_all()
+
+    def write(self, entries):
+        """
+        Writes the entries to the database. Retries until it succeeds,
+        because the votes are already acknowledged to the VoteCollector.
+        """
+        delay = 0.1
+        while True:
+            try:
+                apply_entries(entries)
+            except Exception:
+                logger.exception('Votes from the vote queue could not be written to the database.')
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+            else:
+                return
+            finally:
+                # The worker thread got its own database connection.
+                connection.close()
+
+
+vote_queue = VoteQueue()
+
+
+def queue_votes(voting_mode, poll_id, votes, progress=None):
+    """
+    Stores the votes of a poll without waiting for the database.
+    They are written to the journal if it is enabled, else to the vote
+    queue. progress is a tuple of the room (VoteCollector id), the received
+    votes and the elapsed seconds reported by the device.
+    """
+    if vote_journal.is_enabled():
+        store_votes(voting_mode, poll_id, votes, progress)
+        return
+    if progress is not None:
+        voting_progress.add(*progress)
+    now = time.time()
+    vote_queue.put([dict(vote, mode=voting_mode, poll=poll_id, t=now) for vote in votes])
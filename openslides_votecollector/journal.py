@@ -0,0 +1,269 @@
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .buffers import voting_progress
+from .votes import POLL_MODELS, apply_entries, save_votes
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where OpenSlides runs in one process.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class VoteJournal:
+    """
+    Append-only journal of accepted votes on the local disk. A vote is
+    acknowledged to the VoteCollector as soon as it is in the journal. A
+    background committer writes the votes to the database in batches.
+
+    Votes of concurrent requests are written with one fsync (group commit).
+    Every process writes its own journal file and locks it. Journal files
+    of stopped processes are replayed before the votes of this process are
+    written and before a voting starts, stops or its result is read (see
+    recover()).
+    Writing a vote again does no harm because the last vote of a keypad
+    wins.
+
+    The journal is enabled by the setting VOTECOLLECTOR_JOURNAL_DIR.
+    """
+    commit_interval = 0.05
+    batch_size = 500
+    # The journal file is emptied if all votes are written and it is larger.
+    max_size = 1024 * 1024
+    # Seconds recover() waits for a replay of the committer.
+    replay_timeout = 5
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.has_pending = threading.Condition(self.lock)
+        self.has_written = threading.Condition(self.lock)
+        self.has_applied = threading.Condition(self.lock)
+        self.file = None
+        self.error = None
+        self.pending = []
+        # Counts of appended, written (fsynced) and applied entries.
+        self.appended = 0
+        self.written = 0
+        self.applied = 0
+        self.queue = queue.Queue()
+        # Serializes the replays of this process (see recover()).
+        self.replay_lock = threading.Lock()
+
+    def get_directory(self):
+        return getattr(settings, 'VOTECOLLECTOR_JOURNAL_DIR', None)
+
+    def is_enabled(self):
+        return bool(self.get_directory())
+
+    def start(self):
+        """
+        Opens the journal file of this process and starts the writer and
+        the committer. Has to be called with self.lock held.
+        """
+        if self.file is not None:
+            return
+        directory = self.get_directory()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'votes-%d-%d.journal' % (os.getpid(), time.time() * 1000))
+        self.file = open(path, 'ab')
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        threading.Thread(target=self.run_writer, name='VoteJournalWriter', daemon=True).start()
+        threading.Thread(target=self.run_committer, name='VoteJournalCommitter', daemon=True).start()
+
+    def get_stopped_journals(self):
+        """
+        Returns the paths of all journal files except the one of this
+        process. Files which are still locked are skipped by replay().
+        """
+        paths = glob.glob(os.path.join(self.get_directory(), 'votes-*.journal'))
+        return [path for path in paths if self.file is None or path != self.file.name]
+
+    def recover(self):
+        """
+        Writes the votes of the journal files of stopped processes to the
+        database before returning. Called by the views which start or stop
+        a voting or read its result, not on startup, so that management
+        commands do not touch the journal.
+
+        Errors are logged. The files are kept and replayed later then.
+        """
+        if not self.is_enabled():
+            return
+        # The committer may be replaying with retries if the database is down.
+        if not self.replay_lock.acquire(timeout=self.replay_timeout):
+            logger.warning('Votes of the journal of a stopped process are not replayed yet.')
+            return
+        try:
+            for path in self.get_stopped_journals():
+                self.replay(path, lambda entries: apply_entries(entries, only_newer=True))
+        except Exception:
+            logger.exception('Votes of the journal of a stopped process could not be replayed.')
+        finally:
+            self.replay_lock.release()
+
+    def append(self, entries):
+        """
+        Writes the entries to the journal and waits until they are on disk.
+        Raises OSError if the journal could not be written.
+        """
+        with self.lock:
+            self.start()
+            if self.error is not None:
+                raise self.error
+            self.pending.extend(entries)
+            self.appended += len(entries)
+            count = self.appended
+            self.has_pending.notify()
+            while self.written < count and self.error is None:
+                self.has_written.wait()
+            if self.error is not None:
+                raise self.error
+
+    def drain(self, timeout=5):
+        """
+        Waits until all votes of the journal are written to the database,
+        e. g. when a voting stops.
+        """
+        deadline = time.time() + timeout
+        with self.lock:
+            while self.applied < self.appended and self.error is None and time.time() < deadline:
+                self.has_applied.wait(max(deadline - time.time(), 0))
+
+    def run_writer(self):
+        while True:
+            with self.lock:
+                while not self.pending:
+                    self.has_pending.wait()
+                entries, self.pending = self.pending, []
+                count = self.appended
+            try:
+                self.file.write(b''.join(
+                    json.dumps(entry, separators=(',', ':')).encode('utf-8') + b'\n' for entry in entries))
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            except OSError as e:
+                logger.exception('Votes could not be written to the journal.')
+                with self.lock:
+                    # Waiting requests write their votes directly (see store_votes).
+                    self.error = e
+                    self.has_written.notify_all()
+                return
+            for entry in entries:
+                self.queue.put(entry)
+            with self.lock:
+                self.written = count
+                self.has_written.notify_all()
+
+    def run_committer(self):
+        # Votes of stopped processes first. Own votes are counted as applied
+        # after them, so drain() waits for the replay too.
+        with self.replay_lock:
+            for path in self.get_stopped_journals():
+                self.replay(path, lambda entries: self.commit(entries, only_newer=True))
+        while True:
+            entries = [self.queue.get()]
+            deadline = time.time() + self.commit_interval
+            while len(entries) < self.batch_size:
+                try:
+                    entries.append(self.queue.get(timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+            self.commit(entries)
+            with self.lock:
+                self.applied += len(entries)
+                self.has_applied.notify_all()
+                if self.applied == self.appended and self.file.tell() > self.max_size:
+                    # All votes are in the database.
+                    self.file.truncate(0)
+                    os.fsync(self.file.fileno())
+
+    def commit(self, entries, only_newer=False):
+        """
+        Writes the entries to the database. Retries until it succeeds, the
+        entries are safe in the journal meanwhile. See apply_entries() for
+        only_newer.
+        """
+        delay = 0.5
+        while True:
+            try:
+                apply_entries(entries, only_newer)
+            except Exception:
+                logger.exception('Votes from the journal could not be written to the database.')
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+            else:
+                return
+            finally:
+                # The committer thread got its own database connection.
+                connection.close()
+
+    def replay(self, path, commit):
+        """
+        Writes the votes of the journal file of a stopped process with the
+        given function and deletes the file. Files which are still locked
+        belong to running processes.
+        """
+        try:
+            file = open(path, 'rb+')
+        except OSError:
+            # Replayed by another process.
+            return
+        with file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+            entries = []
+            for line in file:
+                try:
+                    entry = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    # The last line may be incomplete. It was never acknowledged.
+                    continue
+                # The progress of an old voting is not of interest.
+                entry.pop('votes', None)
+                entries.append(entry)
+            for start in range(0, len(entries), self.batch_size):
+                # Other processes may have written newer votes meanwhile.
+                commit(entries[start:start + self.batch_size])
+        os.remove(path)
+        logger.info('%d votes replayed from %s.' % (len(entries), path))
+
+
+vote_journal = VoteJournal()
+
+
+def store_votes(voting_mode, poll_id, votes, progress=None):
+    """
+    Stores the votes of a poll. They are written to the journal if it is
+    enabled, else directly to the database. progress is a tuple of the
+    room (VoteCollector id), the received votes and the elapsed seconds
+    reported by the device.
+    """
+    if vote_journal.is_enabled():
+        now = time.time()
+        entries = [dict(vote, mode=voting_mode, poll=poll_id, t=now) for vote in votes]
+        if progress is not None and entries:
+            entries[-1]['room'], entries[-1]['votes'], entries[-1]['elapsed'] = progress
+        try:
+            vote_journal.append(entries)
+        except OSError:
+            pass
+        else:
+            return
+    save_votes(POLL_MODELS[voting_mode][1], poll_id, votes)
+    if progress is not None:
+        voting_progress.add(*progress)
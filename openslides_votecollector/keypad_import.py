@@ -0,0 +1,147 @@
+import csv
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.translation import ugettext as _
+
+from openslides.users.models import User
+
+from .models import Keypad, Seat
+
+# Columns of the keypad CSV file. This is the users CSV file with the two
+# additional columns keypad_id and seat_label.
+FIELDS = ('title', 'first_name', 'last_name', 'structure_level', 'number', 'groups', 'comment', 'is_active',
+          'is_present', 'is_committee', 'default_password', 'keypad_id', 'seat_label')
+
+
+def get_full_name(title, first_name, last_name, structure_level):
+    """
+    Returns the key which is used to find the user of a keypad.
+    """
+    return ' '.join(str(value or '').strip() for value in (title, first_name, last_name, structure_level))
+
+
+def read_keypads(file):
+    """
+    Generator which reads the rows of a keypad CSV file. The first row
+    contains the column headers and is skipped. Comma or semicolon separated
+    values are accepted.
+    """
+    lines = file.read().decode('utf-8-sig').splitlines()
+    if not lines:
+        return
+    header = lines[0]
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    for row in csv.reader(lines[1:], delimiter=delimiter):
+        if len(row) >= 2:
+            yield dict(zip(FIELDS, row))
+
+
+class KeypadRow:
+    """
+    One row of a keypad import with its resolved user and seat and all
+    errors found during validation.
+    """
+    def __init__(self, line, data):
+        self.line = line
+        self.errors = []
+        self.user_id = None
+        self.seat_id = None
+
+        def get(key):
+            return str(data.get(key) or '').strip()
+
+        if get('first_name') or get('last_name'):
+            self.full_name = get_full_name(get('title'), get('first_name'), get('last_name'), get('structure_level'))
+            self.last_name = get('last_name')
+        else:
+            # No personalized keypad.
+            self.full_name = None
+            self.last_name = None
+        self.seat_label = get('seat_label')
+        try:
+            self.keypad_id = int(get('keypad_id'))
+        except ValueError:
+            self.keypad_id = None
+        if self.keypad_id is None or self.keypad_id <= 0:
+            self.keypad_id = None
+            self.errors.append(_('Keypad ID must be a positive integer value.'))
+
+    def get_report(self, imported):
+        return {
+            'line': self.line,
+            'keypad_id': self.keypad_id,
+            'user_id': self.user_id,
+            'seat_id': self.seat_id,
+            'errors': self.errors,
+            'imported': imported,
+        }
+
+
+def validate_keypads(rows):
+    """
+    Resolves users and seats of all rows with one query each and checks
+    that keypad ids, users and seats are unique, also compared with the
+    existing keypads.
+    """
+    last_names = set(row.last_name for row in rows if row.full_name is not None)
+    seat_labels = set(row.seat_label for row in rows if row.seat_label)
+
+    users = {}
+    for user_id, title, first_name, last_name, structure_level in User.objects.filter(
+            last_name__in=last_names).values_list('pk', 'title', 'first_name', 'last_name', 'structure_level'):
+        users[get_full_name(title, first_name, last_name, structure_level)] = user_id
+    seats = dict(Seat.objects.filter(number__in=seat_labels).values_list('number', 'pk'))
+
+    for row in rows:
+        if row.full_name is not None:
+            row.user_id = users.get(row.full_name)
+            if row.user_id is None:
+                row.errors.append(_('Participant not found.'))
+        if row.seat_label:
+            row.seat_id = seats.get(row.seat_label)
+            if row.seat_id is None:
+                row.errors.append(_('Seat not found.'))
+
+    keypad_ids = set()
+    user_ids = set()
+    seat_ids = set()
+    for keypad_id, user_id, seat_id in Keypad.objects.filter(
+            Q(keypad_id__in=[row.keypad_id for row in rows if row.keypad_id is not None]) |
+            Q(user_id__in=[row.user_id for row in rows if row.user_id is not None]) |
+            Q(seat_id__in=[row.seat_id for row in rows if row.seat_id is not None])).values_list(
+                'keypad_id', 'user_id', 'seat_id'):
+        keypad_ids.add(keypad_id)
+        user_ids.add(user_id)
+        seat_ids.add(seat_id)
+
+    for row in rows:
+        if row.keypad_id is not None and row.keypad_id in keypad_ids:
+            row.errors.append(_('Keypad ID already exists.'))
+        if row.user_id is not None and row.user_id in user_ids:
+            row.errors.append(_('Keypad with this participant already exists.'))
+        if row.seat_id is not None and row.seat_id in seat_ids:
+            row.errors.append(_('The seat is already assigned to a keypad.'))
+        # Later rows of the file must not reuse the values of a valid row.
+        if not row.errors:
+            keypad_ids.add(row.keypad_id)
+            user_ids.add(row.user_id)
+            seat_ids.add(row.seat_id)
+
+
+@transaction.atomic
+def import_keypads(data, dry_run=False):
+    """
+    Validates the keypad rows in memory and creates all valid keypads with
+    one bulk_create. Rows with errors are skipped. Returns the report of
+    all rows. Nothing is written if dry_run is True.
+
+    Attention: This does not trigger an autoupdate for the new keypads.
+    """
+    rows = [KeypadRow(line, row) for line, row in enumerate(data, start=1)]
+    validate_keypads(rows)
+    keypads = [Keypad(keypad_id=row.keypad_id, user_id=row.user_id, seat_id=row.seat_id)
+               for row in rows if not row.errors]
+    if not dry_run:
+        Keypad.objects.bulk_create(keypads)
+    return [row.get_report(imported=not dry_run and not row.errors) for row in rows]
@@ -0,0 +1,283 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from openslides.assignments.models import Assignment
+from openslides.motions.models import Motion, MotionPoll
+from openslides.users.models import User
+
+from ...api import override_config
+from ...cache import keypad_roster
+from ...fake_device import FakeVoteCollector
+from ...ingest import vote_queue
+from ...journal import vote_journal
+from ...models import Keypad
+from ...utils import percentile
+
+# Endpoints: URL name of the start view, poll of the voting and whether the
+# key presses are sent in batches.
+ENDPOINTS = {
+    'vote': ('votecollector_start_voting', 'motion_poll', False),
+    'votes': ('votecollector_start_voting', 'motion_poll', True),
+    'candidate': ('votecollector_start_election_sd', 'assignment_poll', False),
+    'candidates': ('votecollector_start_election_sd', 'assignment_poll', True),
+    'keypad': ('votecollector_start_ping', None, False),
+    'keypads': ('votecollector_start_ping', None, True),
+}
+
+CANDIDATES = 3
+
+
+class Measurement:
+    """
+    Latencies and query counts of the requests of one endpoint.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.queries = []
+        self.keypresses = 0
+        self.duration = 0
+        # Queries of the threads which write queued votes.
+        self.background_queries = 0
+
+    def add(self, latency, queries, keypresses):
+        with self.lock:
+            self.latencies.append(latency)
+            self.queries.append(queries)
+            self.keypresses += keypresses
+
+
+@contextmanager
+def count_background_queries(measurement):
+    """
+    Adds the queries of the vote queue workers to the measurement. The
+    write() method of the vote queue is wrapped meanwhile.
+    """
+    write = vote_queue.write
+
+    def counting_write(entries):
+        with CaptureQueriesContext(connection) as queries:
+            write(entries)
+        with measurement.lock:
+            measurement.background_queries += len(queries)
+
+    vote_queue.write = counting_write
+    try:
+        yield
+    finally:
+        # Use the method of the class again.
+        del vote_queue.write
+
+
+class Command(BaseCommand):
+    """
+    Command to measure the VoteCollector callbacks with a simulated device.
+    """
+    help = ('Benchmarks the VoteCollector callbacks with a local fake VoteCollector. '
+            'Creates a motion, an election and keypads for the test and deletes them afterwards. '
+            'Do not run this during an assembly.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keypads', type=int, default=200,
+            help='Number of simulated keypads. Default: 200.'
+        )
+        parser.add_argument(
+            '--keypresses', type=int, default=1000,
+            help='Number of key presses per endpoint. Default: 1000.'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Key presses per second. Default: 0 (no limit).'
+        )
+        parser.add_argument(
+            '--batch', type=int, default=50,
+            help='Key presses per request of the batch endpoints. Default: 50.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Number of parallel requests. Default: 1.'
+        )
+        parser.add_argument(
+            '--first-keypad-id', type=int, default=900001,
+            help='Keypad ID of the first simulated keypad. Default: 900001.'
+        )
+        parser.add_argument(
+            '--endpoints', default=','.join(sorted(ENDPOINTS)),
+            help='Comma separated endpoints. Default: %s.' % ','.join(sorted(ENDPOINTS))
+        )
+
+    def handle(self, *args, **options):
+        endpoints = options['endpoints'].split(',')
+        for endpoint in endpoints:
+            if endpoint not in ENDPOINTS:
+                raise CommandError('Unknown endpoint %s.' % endpoint)
+        keypad_ids = range(options['first_keypad_id'], options['first_keypad_id'] + options['keypads'])
+        if Keypad.objects.filter(keypad_id__in=keypad_ids).exists():
+            raise CommandError('Keypad IDs %d to %d are already in use.' % (keypad_ids[0], keypad_ids[-1]))
+
+        self.factory = RequestFactory()
+        self.device = FakeVoteCollector()
+        self.motion = self.assignment = None
+        self.users = []
+        # Use the fake device without changing the saved config. The
+        # simulated keypads are anonymous.
+        with override_config(votecollector_uri=self.device.uri, votecollector_method='both'):
+            try:
+                self.device.start()
+                self.create_data(keypad_ids)
+                self.run_endpoints(endpoints, options)
+            finally:
+                self.call_view('votecollector_stop')
+                self.delete_data(keypad_ids)
+                self.device.stop()
+
+    def run_endpoints(self, endpoints, options):
+        """
+        Runs the benchmark of every endpoint and prints the results.
+        """
+        self.stdout.write('%-10s %8s %8s %8s %10s %8s %8s %8s %8s' % (
+            'endpoint', 'requests', 'presses', 'seconds', 'presses/s', 'p50 ms', 'p99 ms', 'queries', 'max q'))
+        for endpoint in endpoints:
+            measurement = self.run_endpoint(endpoint, options)
+            requests = len(measurement.latencies)
+            self.stdout.write('%-10s %8d %8d %8.2f %10.1f %8.2f %8.2f %8.1f %8d' % (
+                endpoint,
+                requests,
+                measurement.keypresses,
+                measurement.duration,
+                measurement.keypresses / measurement.duration if measurement.duration else 0,
+                percentile(measurement.latencies, 50) * 1000,
+                percentile(measurement.latencies, 99) * 1000,
+                (sum(measurement.queries) + measurement.background_queries) / requests,
+                max(measurement.queries)))
+
+    def create_data(self, keypad_ids):
+        """
+        Creates anonymous keypads, a motion poll and an election poll with
+        some candidates.
+        """
+        motion = Motion()
+        motion.title = 'VoteCollector benchmark'
+        motion.text = 'VoteCollector benchmark'
+        motion.save()
+        self.motion = motion
+        self.motion_poll = MotionPoll.objects.create(motion=motion)
+        self.motion_poll.set_options()
+
+        self.assignment = Assignment.objects.create(title='VoteCollector benchmark', open_posts=1)
+        self.users = []
+        for number in range(1, CANDIDATES + 1):
+            user = User.objects.create(
+                username='votecollector-benchmark-%d' % number, last_name='Candidate %d' % number)
+            self.assignment.set_candidate(user)
+            self.users.append(user)
+        self.assignment_poll = self.assignment.polls.create(pollmethod='votes')
+        self.assignment_poll.set_options(
+            [{'candidate': user, 'weight': weight} for weight, user in enumerate(self.users)])
+
+        Keypad.objects.bulk_create(Keypad(keypad_id=keypad_id) for keypad_id in keypad_ids)
+        keypad_roster.invalidate()
+
+    def delete_data(self, keypad_ids):
+        """
+        Deletes the data of create_data(), also if it was created only in
+        part.
+        """
+        Keypad.objects.filter(keypad_id__in=keypad_ids).delete()
+        keypad_roster.invalidate()
+        if self.motion is not None:
+            self.motion.delete()
+        if self.assignment is not None:
+            self.assignment.delete()
+        for user in self.users:
+            user.delete()
+
+    def call_view(self, url_name, **kwargs):
+        """
+        Calls a VoteCollector view without permission check.
+        """
+        path = reverse(url_name, kwargs=kwargs)
+        match = resolve(path)
+        view = match.func.view_class.as_view(required_permission=None)
+        return view(self.factory.get(path), *match.args, **match.kwargs)
+
+    def run_endpoint(self, endpoint, options):
+        """
+        Starts a voting and sends the simulated key presses to the callback
+        URL given to the device.
+        """
+        url_name, poll, batch = ENDPOINTS[endpoint]
+        kwargs = {}
+        if poll is not None:
+            kwargs['id'] = getattr(self, poll).pk
+        if url_name == 'votecollector_start_election_sd':
+            kwargs['options'] = CANDIDATES
+        response = json.loads(self.call_view(url_name, **kwargs).content.decode('utf-8'))
+        if 'error' in response:
+            raise CommandError('Voting could not be started: %s' % response['error'])
+        path = urlparse(self.device.callback_url).path
+
+        batch_size = options['batch'] if batch else 1
+        keypresses = self.device.keypresses(options['keypresses'])
+        lock = threading.Lock()
+        # Every worker sends its share of the rate.
+        interval = batch_size * options['concurrency'] / options['rate'] if options['rate'] else 0
+        measurement = Measurement()
+
+        def work():
+            next_time = time.time()
+            try:
+                while True:
+                    with lock:
+                        presses = [keypress for keypress in (next(keypresses, None) for i in range(batch_size))
+                                   if keypress is not None]
+                    if not presses:
+                        return
+                    if batch:
+                        request = self.factory.post(
+                            path, self.device.get_batch_data(presses), content_type='application/json')
+                        request_path = path
+                    else:
+                        keypad_id, key = presses[0]
+                        request_path = '%s%d/' % (path, keypad_id)
+                        request = self.factory.post(request_path, self.device.get_vote_data(keypad_id, key))
+                    match = resolve(request_path)
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        match.func(request, *match.args, **match.kwargs)
+                        latency = time.perf_counter() - start
+                    measurement.add(latency, len(queries), len(presses))
+                    next_time += interval
+                    time.sleep(max(next_time - time.time(), 0))
+            finally:
+                if threading.current_thread() is not main_thread:
+                    connection.close()
+
+        main_thread = threading.current_thread()
+        with count_background_queries(measurement):
+            start = time.perf_counter()
+            if options['concurrency'] > 1:
+                threads = [threading.Thread(target=work) for i in range(options['concurrency'])]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            else:
+                work()
+            # Single votes are written by the workers of the vote queue or the
+            # journal after the response.
+            vote_queue.drain(timeout=600)
+            vote_journal.drain(timeout=600)
+            measurement.duration = time.perf_counter() - start
+        self.call_view('votecollector_stop')
+        return measurement
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openslides_votecollector', '0002_seats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='votecollector',
+            name='connection_state',
+            field=models.CharField(default='closed', max_length=20),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openslides_votecollector', '0003_votecollector_connection_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='votecollector',
+            name='live_tally',
+            field=jsonfield.fields.JSONField(default={}),
+        ),
+    ]
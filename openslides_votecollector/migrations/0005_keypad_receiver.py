@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openslides_votecollector', '0004_votecollector_live_tally'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keypad',
+            name='receiver',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_connections(apps, schema_editor):
+    """
+    Keeps only the latest connection of every keypad and poll, so that the
+    unique constraint can be added.
+    """
+    for model_name in ('MotionPollKeypadConnection', 'AssignmentPollKeypadConnection'):
+        model = apps.get_model('openslides_votecollector', model_name)
+        duplicates = model.objects.exclude(keypad=None).order_by().values('poll_id', 'keypad_id').annotate(
+            last_id=Max('id'), count=Count('id')).filter(count__gt=1)
+        for duplicate in duplicates:
+            model.objects.filter(poll_id=duplicate['poll_id'], keypad_id=duplicate['keypad_id']).exclude(
+                pk=duplicate['last_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openslides_votecollector', '0005_keypad_receiver'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_connections,
+            migrations.RunPython.noop
+        ),
+        migrations.AlterUniqueTogether(
+            name='motionpollkeypadconnection',
+            unique_together=set([('poll', 'keypad')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='assignmentpollkeypadconnection',
+            unique_together=set([('poll', 'keypad')]),
+        ),
+    ]
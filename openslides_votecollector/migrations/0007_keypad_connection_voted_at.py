@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openslides_votecollector', '0006_keypad_connection_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='motionpollkeypadconnection',
+            name='voted_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='assignmentpollkeypadconnection',
+            name='voted_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openslides_votecollector', '0007_keypad_connection_voted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='votecollector',
+            name='name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='votecollector',
+            name='receivers',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
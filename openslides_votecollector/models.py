@@ -2,6 +2,7 @@ from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.translation import ugettext as _
+from jsonfield import JSONField
 
 from openslides.core.config import config
 from openslides.assignments.models import AssignmentPoll
@@ -28,10 +29,16 @@ class VoteCollector(RESTModelMixin, models.Model):
     """
     VoteCollector model. Provides device and voting status information.
 
-    Currently only one votecollector is supported (pk=1).
+    Every VoteCollector is a room with its own receivers and voting. The
+    first one (pk=1) is the default room and uses all receivers unless
+    receivers are given (see api.py).
     """
     access_permissions = VoteCollectorAccessPermissions()
 
+    name = models.CharField(max_length=100, blank=True, default='')
+    # Space separated numbers of the receivers of this room (1 = first URL).
+    # Empty for all receivers.
+    receivers = models.CharField(max_length=100, blank=True, default='')
     device_status = models.CharField(max_length=200, default='No device')
     voting_mode = models.CharField(max_length=50, null=True)
     voting_target = models.IntegerField(default=0)
@@ -39,6 +46,10 @@ class VoteCollector(RESTModelMixin, models.Model):
     voters_count = models.IntegerField(default=0)
     votes_received = models.IntegerField(default=0)
     is_voting = models.BooleanField(default=False)
+    # State of the circuit breaker for the connection to the device (see api.py).
+    connection_state = models.CharField(max_length=20, default='closed')
+    # Running tally of the current voting (see tally.py).
+    live_tally = JSONField(default={})
 
     class Meta:
         default_permissions = ()
@@ -47,7 +58,22 @@ class VoteCollector(RESTModelMixin, models.Model):
         )
 
     def __str__(self):
-        return self.device_status
+        return self.name or self.device_status
+
+    def get_receivers(self, count):
+        """
+        Returns the indexes of the receivers of this room for the given
+        number of configured receivers. Unknown receivers are ignored.
+        Raises ValueError if the receivers field is invalid.
+        """
+        numbers = [int(number) for number in self.receivers.replace(',', ' ').split()]
+        if any(number < 1 for number in numbers):
+            raise ValueError(self.receivers)
+        if count is None:
+            return [number - 1 for number in numbers]
+        if not numbers:
+            return list(range(count))
+        return sorted(set(number - 1 for number in numbers if number <= count))
 
 
 class Seat(RESTModelMixin, models.Model):
@@ -95,6 +121,8 @@ class Keypad(RESTModelMixin, models.Model):
     user = models.OneToOneField(User, null=True, blank=True)
     keypad_id = models.IntegerField(unique=True)
     seat = models.OneToOneField(Seat, null=True, blank=True)
+    # Number of the receiver which serves this keypad (1 = first URL, see api.py).
+    receiver = models.PositiveSmallIntegerField(default=1)
     battery_level = models.SmallIntegerField(default=-1)  # -1 = unknown # TODO Remove this redundant db field.
     in_range = models.BooleanField(default=False)
 
@@ -117,9 +145,13 @@ class MotionPollKeypadConnection(RESTModelMixin, models.Model):
     keypad = models.ForeignKey(Keypad, on_delete=models.CASCADE, null=True)
     value = models.CharField(max_length=255)
     serial_number = models.CharField(null=True, max_length=255)
+    # Time when the vote was received. Replayed votes do not overwrite newer ones.
+    voted_at = models.DateTimeField(null=True)
 
     class Meta:
         default_permissions = ()
+        # One vote per keypad. Anonymized votes have no keypad.
+        unique_together = ('poll', 'keypad')
 
     def get_value(self):
         """
@@ -148,6 +180,10 @@ class AssignmentPollKeypadConnection(RESTModelMixin, models.Model):
     candidate = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True)
     value = models.CharField(max_length=255)
     serial_number = models.CharField(null=True, max_length=255)
+    # Time when the vote was received. Replayed votes do not overwrite newer ones.
+    voted_at = models.DateTimeField(null=True)
 
     class Meta:
         default_permissions = ()
+        # One vote per keypad. Anonymized votes have no keypad.
+        unique_together = ('poll', 'keypad')
@@ -4,9 +4,47 @@ from openslides.core.config import config
 from openslides.core.exceptions import ProjectorException
 from openslides.assignments.models import AssignmentPoll
 from openslides.motions.models import MotionPoll
+from openslides.utils.collection import CollectionElement
 from openslides.utils.projector import ProjectorElement
 
-from .models import Keypad, Seat, MotionPollKeypadConnection, AssignmentPollKeypadConnection, VoteCollector
+from .cache import seating_plan_snapshot
+from .models import Keypad, MotionPollKeypadConnection, AssignmentPollKeypadConnection, VoteCollector
+
+
+def is_votecollector_config_change(collection_element):
+    """
+    Returns True if a config variable of this plugin was changed.
+    """
+    return (collection_element.information.get('changed_config') or '').startswith('votecollector_')
+
+
+def needs_connections():
+    """
+    Returns True if the poll slides need the keypad connections: to colour
+    the seats of the seating plan or to count the votes of a poll which is
+    not counted by the live tally of the VoteCollector.
+    """
+    return config['votecollector_seating_plan'] or config['votecollector_live_voting']
+
+
+def get_changed_config_elements(collection_element, connections):
+    """
+    Returns the collection elements required by a poll slide if a config
+    variable of this plugin was changed: The config element only and, if the
+    seating plan was switched on, all seats, keypads and keypad users. The
+    given connections of the poll are added if the seating plan or the live
+    voting was switched on.
+    """
+    output = [collection_element]
+    changed_config = collection_element.information['changed_config']
+    if changed_config == 'votecollector_seating_plan' and config['votecollector_seating_plan']:
+        for instance in seating_plan_snapshot.get():
+            output.append(CollectionElement.from_instance(instance))
+    if changed_config in ('votecollector_seating_plan', 'votecollector_live_voting') and \
+            config[changed_config]:
+        for connection in connections:
+            output.append(CollectionElement.from_instance(connection))
+    return output
 
 
 class MotionPollSlide(ProjectorElement):
@@ -29,27 +67,28 @@ class MotionPollSlide(ProjectorElement):
             yield motionpoll.motion
             yield motionpoll.motion.agenda_item
             if config['votecollector_seating_plan']:
-                yield from Seat.objects.all()
-                keypads = Keypad.objects.all()
-                yield from keypads
-                for keypad in keypads:
-                    # Yield user of each keypad
-                    if keypad.user is not None:
-                        yield keypad.user
-            yield from MotionPollKeypadConnection.objects.filter(poll=motionpoll)
+                # Yield all seats, keypads and the user of each keypad.
+                yield from seating_plan_snapshot.get()
+            if needs_connections():
+                # Votes are needed to colour the seats and to count them.
+                yield from MotionPollKeypadConnection.objects.filter(poll=motionpoll)
+            # The VoteCollectors of all rooms provide the live tallies.
+            yield from VoteCollector.objects.all()
 
     def get_collection_elements_required_for_this(self, collection_element, config_entry):
-        # If MPKC or Keypad is updated send only this element to projectors.
-        # Else use default (which means a huge parsing of requirements).
+        # If MPKC, Keypad or VoteCollector is updated send only this element
+        # to projectors. Else use default (which means a huge parsing of requirements).
         if collection_element.collection_string == MotionPollKeypadConnection.get_collection_string():
-            output = [collection_element]
+            output = [collection_element] if needs_connections() else []
         elif collection_element.collection_string == Keypad.get_collection_string():
             output = [collection_element]
         elif collection_element.collection_string == VoteCollector.get_collection_string():
-            output = []
+            output = [collection_element]
         elif collection_element.information.get('votecollector_voting_msg_toggled'):
             output = []
-        # TODO: Add new elif if seating plan config changed, use "information.get('changed_config')"
+        elif is_votecollector_config_change(collection_element):
+            output = get_changed_config_elements(
+                collection_element, MotionPollKeypadConnection.objects.filter(poll_id=config_entry.get('id')))
         else:
             output = super().get_collection_elements_required_for_this(collection_element, config_entry)
         return output
@@ -77,25 +116,28 @@ class AssignmentPollSlide(ProjectorElement):
             for option in assignmentpoll.options.all():
                 yield option.candidate
             if config['votecollector_seating_plan']:
-                yield from Seat.objects.all()
-                keypads = Keypad.objects.all()
-                yield from keypads
-                for keypad in keypads:
-                    # Yield user of each keypad
-                    if keypad.user is not None:
-                        yield keypad.user
-            yield from AssignmentPollKeypadConnection.objects.filter(poll=assignmentpoll)
+                # Yield all seats, keypads and the user of each keypad.
+                yield from seating_plan_snapshot.get()
+            if needs_connections():
+                # Votes are needed to colour the seats and to count them.
+                yield from AssignmentPollKeypadConnection.objects.filter(poll=assignmentpoll)
+            # The VoteCollectors of all rooms provide the live tallies.
+            yield from VoteCollector.objects.all()
 
     def get_collection_elements_required_for_this(self, collection_element, config_entry):
-        # If APKC or Keypad is updated send only this element to projectors.
-        # Else use default (which means a huge parsing of requirements).
+        # If APKC, Keypad or VoteCollector is updated send only this element
+        # to projectors. Else use default (which means a huge parsing of requirements).
         if collection_element.collection_string == AssignmentPollKeypadConnection.get_collection_string():
-            output = [collection_element]
+            output = [collection_element] if needs_connections() else []
         elif collection_element.collection_string == Keypad.get_collection_string():
             output = [collection_element]
+        elif collection_element.collection_string == VoteCollector.get_collection_string():
+            output = [collection_element]
         elif collection_element.information.get('votecollector_voting_msg_toggled'):
             output = []
-        # TODO: Add new elif if seating plan config changed, use "information.get('changed_config')"
+        elif is_votecollector_config_change(collection_element):
+            output = get_changed_config_elements(
+                collection_element, AssignmentPollKeypadConnection.objects.filter(poll_id=config_entry.get('id')))
         else:
             output = super().get_collection_elements_required_for_this(collection_element, config_entry)
         return output
@@ -0,0 +1,98 @@
+"""
+Sends device callbacks captured by capture.py to an OpenSlides server
+again, e. g. to profile a test instance with the traffic of a real
+assembly:
+
+    python -m openslides_votecollector.replay capture.jsonl --url http://localhost:8000 --speed 10
+
+The poll ids in the captured paths have to exist on the test instance. Use
+--rewrite to change parts of the paths. It does not need a configured
+OpenSlides project.
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+
+from .utils import percentile
+
+
+def read_capture(file, rewrites=()):
+    """
+    Returns the captured requests of the file ordered by arrival time.
+    Several worker processes write the requests in the order they were
+    answered.
+    """
+    entries = []
+    for line in file:
+        if line.strip():
+            entry = json.loads(line)
+            for old, new in rewrites:
+                entry['path'] = entry['path'].replace(old, new)
+            entries.append(entry)
+    entries.sort(key=lambda entry: entry['t'])
+    return entries
+
+
+def replay(entries, url, speed=1, concurrency=8):
+    """
+    Sends the captured requests to the server at url. The gaps between the
+    requests are divided by speed. With speed 0 all requests are sent as
+    fast as possible. Returns a list of (latency, status) tuples.
+    """
+    results = []
+    lock = threading.Lock()
+
+    def send(entry):
+        request = Request(url.rstrip('/') + entry['path'], entry['body'].encode('utf-8'))
+        if entry['type']:
+            request.add_header('Content-Type', entry['type'])
+        start = time.perf_counter()
+        try:
+            with urlopen(request) as response:
+                response.read()
+                status = response.status
+        except OSError as e:
+            status = getattr(e, 'code', None) or str(e)
+        with lock:
+            results.append((time.perf_counter() - start, status))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        first = None
+        start = time.time()
+        for entry in entries:
+            if first is None:
+                first = entry['t']
+            if speed:
+                time.sleep(max(start + (entry['t'] - first) / speed - time.time(), 0))
+            executor.submit(send, entry)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays captured VoteCollector callbacks.')
+    parser.add_argument('file', type=argparse.FileType('r'), help='Capture file (see VOTECOLLECTOR_CAPTURE_FILE).')
+    parser.add_argument('--url', default='http://localhost:8000', help='URL of the OpenSlides server.')
+    parser.add_argument('--speed', type=float, default=1, help='Speed factor, e. g. 1 or 10. 0 = no limit.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Maximum number of parallel requests.')
+    parser.add_argument('--rewrite', nargs=2, action='append', default=[], metavar=('OLD', 'NEW'),
+                        help='Replace OLD by NEW in all paths. Can be given several times.')
+    args = parser.parse_args()
+
+    start = time.time()
+    results = replay(read_capture(args.file, args.rewrite), args.url, args.speed, args.concurrency)
+    duration = time.time() - start
+    if not results:
+        print('No requests captured.')
+        return
+    latencies = [latency for latency, status in results]
+    errors = sum(1 for latency, status in results if status != 200)
+    print('%d requests in %.2f seconds (%.1f/s), %d errors' % (
+        len(results), duration, len(results) / duration, errors))
+    print('latency p50 %.2f ms, p99 %.2f ms' % (percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,139 +1,155 @@
-from .models import Seat
+import csv
+import json
 
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.translation import ugettext as _
 
-def setup_default_plan():
+from .models import Keypad, Seat
+
+# Default hall: A podium and three blocks with six rows each, divided by two
+# aisles. Seats are numbered row by row from left to right.
+DEFAULT_LAYOUT = {
+    'numbering': 'rows',
+    'blocks': [
+        # Podium
+        {'x': 8, 'y': 1, 'columns': 6, 'rows': 1},
+        # Hall
+        {'x': 1, 'y': 3, 'columns': 20, 'rows': 6, 'aisles': [7, 14]},
+    ],
+}
+
+
+def generate_seats(layout):
     """
-    Adds a default seating plan.
+    Generates unsaved seats from a compact layout description:
+
+    {
+        'numbering': 'rows' or 'blocks' or 'none',
+        'start': 1,
+        'prefix': '',
+        'blocks': [
+            {'x': 1, 'y': 3, 'columns': 20, 'rows': 6, 'aisles': [7, 14]},
+        ]
+    }
+
+    x and y are the coordinates of the upper left seat of a block. Aisles
+    are x coordinates within a block without seats. With numbering 'rows'
+    the seats are numbered row by row across all blocks, with 'blocks' one
+    block after another. Seats are not numbered with 'none'.
     """
+    try:
+        coordinates = []
+        for block in layout['blocks']:
+            aisles = set(int(x) for x in block.get('aisles', ()))
+            x_start, y_start = int(block['x']), int(block['y'])
+            block_coordinates = []
+            for y in range(y_start, y_start + int(block['rows'])):
+                for x in range(x_start, x_start + int(block['columns'])):
+                    if x not in aisles:
+                        block_coordinates.append((x, y))
+            coordinates.append(block_coordinates)
+        numbering = layout.get('numbering', 'rows')
+        start = int(layout.get('start', 1))
+        prefix = str(layout.get('prefix', ''))
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError(_('Invalid seating plan layout.'))
+
+    if numbering == 'rows':
+        ordered = sorted((x_y for block in coordinates for x_y in block), key=lambda x_y: (x_y[1], x_y[0]))
+    elif numbering in ('blocks', 'none'):
+        ordered = [x_y for block in coordinates for x_y in block]
+    else:
+        raise ValidationError(_('Invalid seating plan layout.'))
+
     seats = []
+    for index, (x, y) in enumerate(ordered):
+        number = '' if numbering == 'none' else prefix + str(start + index)
+        seats.append(Seat(number=number, seating_plan_x_axis=x, seating_plan_y_axis=y))
+    return seats
+
+
+def read_seats(file, file_format):
+    """
+    Generator which reads seats from a CSV file (columns number, x, y) or a
+    JSON file (a list of such objects or a layout description).
+    """
+    try:
+        text = file.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValidationError(_('The file has to be UTF-8 encoded.'))
+    if file_format == 'csv':
+        yield from parse_seats(csv.DictReader(text.splitlines()))
+    else:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            raise ValidationError(_('Invalid JSON file.'))
+        if isinstance(data, dict):
+            yield from generate_seats(data)
+        elif isinstance(data, list):
+            yield from parse_seats(data)
+        else:
+            raise ValidationError(_('Invalid seating plan layout.'))
+
 
-    # Podium
-    seats.append(Seat(number=1, seating_plan_x_axis=8, seating_plan_y_axis=1))
-    seats.append(Seat(number=2, seating_plan_x_axis=9, seating_plan_y_axis=1))
-    seats.append(Seat(number=3, seating_plan_x_axis=10, seating_plan_y_axis=1))
-    seats.append(Seat(number=4, seating_plan_x_axis=11, seating_plan_y_axis=1))
-    seats.append(Seat(number=5, seating_plan_x_axis=12, seating_plan_y_axis=1))
-    seats.append(Seat(number=6, seating_plan_x_axis=13, seating_plan_y_axis=1))
-
-    # 1st row
-    seats.append(Seat(number=7, seating_plan_x_axis=1, seating_plan_y_axis=3))
-    seats.append(Seat(number=8, seating_plan_x_axis=2, seating_plan_y_axis=3))
-    seats.append(Seat(number=9, seating_plan_x_axis=3, seating_plan_y_axis=3))
-    seats.append(Seat(number=10, seating_plan_x_axis=4, seating_plan_y_axis=3))
-    seats.append(Seat(number=11, seating_plan_x_axis=5, seating_plan_y_axis=3))
-    seats.append(Seat(number=12, seating_plan_x_axis=6, seating_plan_y_axis=3))
-    seats.append(Seat(number=13, seating_plan_x_axis=8, seating_plan_y_axis=3))
-    seats.append(Seat(number=14, seating_plan_x_axis=9, seating_plan_y_axis=3))
-    seats.append(Seat(number=15, seating_plan_x_axis=10, seating_plan_y_axis=3))
-    seats.append(Seat(number=16, seating_plan_x_axis=11, seating_plan_y_axis=3))
-    seats.append(Seat(number=17, seating_plan_x_axis=12, seating_plan_y_axis=3))
-    seats.append(Seat(number=18, seating_plan_x_axis=13, seating_plan_y_axis=3))
-    seats.append(Seat(number=19, seating_plan_x_axis=15, seating_plan_y_axis=3))
-    seats.append(Seat(number=20, seating_plan_x_axis=16, seating_plan_y_axis=3))
-    seats.append(Seat(number=21, seating_plan_x_axis=17, seating_plan_y_axis=3))
-    seats.append(Seat(number=22, seating_plan_x_axis=18, seating_plan_y_axis=3))
-    seats.append(Seat(number=23, seating_plan_x_axis=19, seating_plan_y_axis=3))
-    seats.append(Seat(number=24, seating_plan_x_axis=20, seating_plan_y_axis=3))
-
-    # 2nd row
-    seats.append(Seat(number=25, seating_plan_x_axis=1, seating_plan_y_axis=4))
-    seats.append(Seat(number=26, seating_plan_x_axis=2, seating_plan_y_axis=4))
-    seats.append(Seat(number=27, seating_plan_x_axis=3, seating_plan_y_axis=4))
-    seats.append(Seat(number=28, seating_plan_x_axis=4, seating_plan_y_axis=4))
-    seats.append(Seat(number=29, seating_plan_x_axis=5, seating_plan_y_axis=4))
-    seats.append(Seat(number=30, seating_plan_x_axis=6, seating_plan_y_axis=4))
-    seats.append(Seat(number=31, seating_plan_x_axis=8, seating_plan_y_axis=4))
-    seats.append(Seat(number=32, seating_plan_x_axis=9, seating_plan_y_axis=4))
-    seats.append(Seat(number=33, seating_plan_x_axis=10, seating_plan_y_axis=4))
-    seats.append(Seat(number=34, seating_plan_x_axis=11, seating_plan_y_axis=4))
-    seats.append(Seat(number=35, seating_plan_x_axis=12, seating_plan_y_axis=4))
-    seats.append(Seat(number=36, seating_plan_x_axis=13, seating_plan_y_axis=4))
-    seats.append(Seat(number=37, seating_plan_x_axis=15, seating_plan_y_axis=4))
-    seats.append(Seat(number=38, seating_plan_x_axis=16, seating_plan_y_axis=4))
-    seats.append(Seat(number=39, seating_plan_x_axis=17, seating_plan_y_axis=4))
-    seats.append(Seat(number=40, seating_plan_x_axis=18, seating_plan_y_axis=4))
-    seats.append(Seat(number=41, seating_plan_x_axis=19, seating_plan_y_axis=4))
-    seats.append(Seat(number=42, seating_plan_x_axis=20, seating_plan_y_axis=4))
-
-    # 3rd row
-    seats.append(Seat(number=43, seating_plan_x_axis=1, seating_plan_y_axis=5))
-    seats.append(Seat(number=44, seating_plan_x_axis=2, seating_plan_y_axis=5))
-    seats.append(Seat(number=45, seating_plan_x_axis=3, seating_plan_y_axis=5))
-    seats.append(Seat(number=46, seating_plan_x_axis=4, seating_plan_y_axis=5))
-    seats.append(Seat(number=47, seating_plan_x_axis=5, seating_plan_y_axis=5))
-    seats.append(Seat(number=48, seating_plan_x_axis=6, seating_plan_y_axis=5))
-    seats.append(Seat(number=49, seating_plan_x_axis=8, seating_plan_y_axis=5))
-    seats.append(Seat(number=50, seating_plan_x_axis=9, seating_plan_y_axis=5))
-    seats.append(Seat(number=51, seating_plan_x_axis=10, seating_plan_y_axis=5))
-    seats.append(Seat(number=52, seating_plan_x_axis=11, seating_plan_y_axis=5))
-    seats.append(Seat(number=53, seating_plan_x_axis=12, seating_plan_y_axis=5))
-    seats.append(Seat(number=54, seating_plan_x_axis=13, seating_plan_y_axis=5))
-    seats.append(Seat(number=55, seating_plan_x_axis=15, seating_plan_y_axis=5))
-    seats.append(Seat(number=56, seating_plan_x_axis=16, seating_plan_y_axis=5))
-    seats.append(Seat(number=57, seating_plan_x_axis=17, seating_plan_y_axis=5))
-    seats.append(Seat(number=58, seating_plan_x_axis=18, seating_plan_y_axis=5))
-    seats.append(Seat(number=59, seating_plan_x_axis=19, seating_plan_y_axis=5))
-    seats.append(Seat(number=60, seating_plan_x_axis=20, seating_plan_y_axis=5))
-
-    # 4th row
-    seats.append(Seat(number=61, seating_plan_x_axis=1, seating_plan_y_axis=6))
-    seats.append(Seat(number=62, seating_plan_x_axis=2, seating_plan_y_axis=6))
-    seats.append(Seat(number=63, seating_plan_x_axis=3, seating_plan_y_axis=6))
-    seats.append(Seat(number=64, seating_plan_x_axis=4, seating_plan_y_axis=6))
-    seats.append(Seat(number=65, seating_plan_x_axis=5, seating_plan_y_axis=6))
-    seats.append(Seat(number=66, seating_plan_x_axis=6, seating_plan_y_axis=6))
-    seats.append(Seat(number=67, seating_plan_x_axis=8, seating_plan_y_axis=6))
-    seats.append(Seat(number=68, seating_plan_x_axis=9, seating_plan_y_axis=6))
-    seats.append(Seat(number=69, seating_plan_x_axis=10, seating_plan_y_axis=6))
-    seats.append(Seat(number=70, seating_plan_x_axis=11, seating_plan_y_axis=6))
-    seats.append(Seat(number=71, seating_plan_x_axis=12, seating_plan_y_axis=6))
-    seats.append(Seat(number=72, seating_plan_x_axis=13, seating_plan_y_axis=6))
-    seats.append(Seat(number=73, seating_plan_x_axis=15, seating_plan_y_axis=6))
-    seats.append(Seat(number=74, seating_plan_x_axis=16, seating_plan_y_axis=6))
-    seats.append(Seat(number=75, seating_plan_x_axis=17, seating_plan_y_axis=6))
-    seats.append(Seat(number=76, seating_plan_x_axis=18, seating_plan_y_axis=6))
-    seats.append(Seat(number=77, seating_plan_x_axis=19, seating_plan_y_axis=6))
-    seats.append(Seat(number=78, seating_plan_x_axis=20, seating_plan_y_axis=6))
-
-    # 5th row
-    seats.append(Seat(number=79, seating_plan_x_axis=1, seating_plan_y_axis=7))
-    seats.append(Seat(number=80, seating_plan_x_axis=2, seating_plan_y_axis=7))
-    seats.append(Seat(number=81, seating_plan_x_axis=3, seating_plan_y_axis=7))
-    seats.append(Seat(number=82, seating_plan_x_axis=4, seating_plan_y_axis=7))
-    seats.append(Seat(number=83, seating_plan_x_axis=5, seating_plan_y_axis=7))
-    seats.append(Seat(number=84, seating_plan_x_axis=6, seating_plan_y_axis=7))
-    seats.append(Seat(number=85, seating_plan_x_axis=8, seating_plan_y_axis=7))
-    seats.append(Seat(number=86, seating_plan_x_axis=9, seating_plan_y_axis=7))
-    seats.append(Seat(number=87, seating_plan_x_axis=10, seating_plan_y_axis=7))
-    seats.append(Seat(number=88, seating_plan_x_axis=11, seating_plan_y_axis=7))
-    seats.append(Seat(number=89, seating_plan_x_axis=12, seating_plan_y_axis=7))
-    seats.append(Seat(number=90, seating_plan_x_axis=13, seating_plan_y_axis=7))
-    seats.append(Seat(number=91, seating_plan_x_axis=15, seating_plan_y_axis=7))
-    seats.append(Seat(number=92, seating_plan_x_axis=16, seating_plan_y_axis=7))
-    seats.append(Seat(number=93, seating_plan_x_axis=17, seating_plan_y_axis=7))
-    seats.append(Seat(number=94, seating_plan_x_axis=18, seating_plan_y_axis=7))
-    seats.append(Seat(number=95, seating_plan_x_axis=19, seating_plan_y_axis=7))
-    seats.append(Seat(number=96, seating_plan_x_axis=20, seating_plan_y_axis=7))
-
-    # 6th row
-    seats.append(Seat(number=97, seating_plan_x_axis=1, seating_plan_y_axis=8))
-    seats.append(Seat(number=98, seating_plan_x_axis=2, seating_plan_y_axis=8))
-    seats.append(Seat(number=99, seating_plan_x_axis=3, seating_plan_y_axis=8))
-    seats.append(Seat(number=100, seating_plan_x_axis=4, seating_plan_y_axis=8))
-    seats.append(Seat(number=101, seating_plan_x_axis=5, seating_plan_y_axis=8))
-    seats.append(Seat(number=102, seating_plan_x_axis=6, seating_plan_y_axis=8))
-    seats.append(Seat(number=103, seating_plan_x_axis=8, seating_plan_y_axis=8))
-    seats.append(Seat(number=104, seating_plan_x_axis=9, seating_plan_y_axis=8))
-    seats.append(Seat(number=105, seating_plan_x_axis=10, seating_plan_y_axis=8))
-    seats.append(Seat(number=106, seating_plan_x_axis=11, seating_plan_y_axis=8))
-    seats.append(Seat(number=107, seating_plan_x_axis=12, seating_plan_y_axis=8))
-    seats.append(Seat(number=108, seating_plan_x_axis=13, seating_plan_y_axis=8))
-    seats.append(Seat(number=109, seating_plan_x_axis=15, seating_plan_y_axis=8))
-    seats.append(Seat(number=110, seating_plan_x_axis=16, seating_plan_y_axis=8))
-    seats.append(Seat(number=111, seating_plan_x_axis=17, seating_plan_y_axis=8))
-    seats.append(Seat(number=112, seating_plan_x_axis=18, seating_plan_y_axis=8))
-    seats.append(Seat(number=113, seating_plan_x_axis=19, seating_plan_y_axis=8))
-    seats.append(Seat(number=114, seating_plan_x_axis=20, seating_plan_y_axis=8))
-
-    # Create seats
+def parse_seats(rows):
+    """
+    Generator which builds seats from dictionaries with number, x and y.
+    """
+    for line, row in enumerate(rows, start=1):
+        try:
+            yield Seat(
+                number=str(row.get('number') or '').strip(),
+                seating_plan_x_axis=int(row['x']),
+                seating_plan_y_axis=int(row['y']))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            raise ValidationError(_('Invalid seat in line %d.') % line)
+
+
+def validate_seats(seats, existing_seats=()):
+    """
+    Ensures that non empty seat numbers and the coordinates of all seats are
+    unique, also compared with the existing seats.
+    """
+    numbers = set(seat.number for seat in existing_seats if seat.number != '')
+    coordinates = set((seat.seating_plan_x_axis, seat.seating_plan_y_axis) for seat in existing_seats)
+    for seat in seats:
+        if seat.seating_plan_x_axis < 0 or seat.seating_plan_y_axis < 0:
+            raise ValidationError(_('Invalid coordinates of seat %s.') % seat.number)
+        if seat.number != '':
+            if seat.number in numbers:
+                raise ValidationError(_('Seat number %s is not unique.') % seat.number)
+            numbers.add(seat.number)
+        x_y = (seat.seating_plan_x_axis, seat.seating_plan_y_axis)
+        if x_y in coordinates:
+            raise ValidationError(_('Seat position %d/%d is not unique.') % x_y)
+        coordinates.add(x_y)
+
+
+@transaction.atomic
+def import_seats(seats, replace=False):
+    """
+    Validates the seats in memory and writes them with one bulk_create. If
+    replace is True, all existing seats are deleted before. Keypads lose
+    their seats then.
+
+    Attention: This does not trigger an autoupdate for the new seats.
+    """
+    seats = list(seats)
+    if replace:
+        Keypad.objects.exclude(seat=None).update(seat=None)
+        Seat.objects.all().delete()
+        existing_seats = ()
+    else:
+        existing_seats = Seat.objects.only('number', 'seating_plan_x_axis', 'seating_plan_y_axis')
+    validate_seats(seats, existing_seats)
     Seat.objects.bulk_create(seats)
+    return len(seats)
+
+
+def setup_default_plan():
+    """
+    Adds a default seating plan.
+    """
+    Seat.objects.bulk_create(generate_seats(DEFAULT_LAYOUT))
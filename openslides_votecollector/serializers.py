@@ -1,4 +1,6 @@
-from openslides.utils.rest_api import ModelSerializer, RelatedField, SerializerMethodField
+from django.utils.translation import ugettext as _
+
+from openslides.utils.rest_api import ModelSerializer, RelatedField, SerializerMethodField, ValidationError
 
 from .models import AssignmentPollKeypadConnection, Keypad, MotionPollKeypadConnection, Seat, VoteCollector
 
@@ -11,6 +13,8 @@ class VoteCollectorSerializer(ModelSerializer):
         model = VoteCollector
         fields = (
             'id',
+            'name',
+            'receivers',
             'device_status',
             'voting_mode',
             'voting_target',
@@ -18,7 +22,27 @@ class VoteCollectorSerializer(ModelSerializer):
             'voters_count',
             'votes_received',
             'is_voting',
+            'connection_state',
+            'live_tally',
         )
+        read_only_fields = (
+            'device_status',
+            'voting_mode',
+            'voting_target',
+            'voting_duration',
+            'voters_count',
+            'votes_received',
+            'is_voting',
+            'connection_state',
+            'live_tally',
+        )
+
+    def validate_receivers(self, value):
+        try:
+            VoteCollector(receivers=value).get_receivers(None)
+        except ValueError:
+            raise ValidationError(_('Invalid receiver numbers.'))
+        return value
 
 
 class KeypadSerializer(ModelSerializer):
@@ -32,6 +56,7 @@ class KeypadSerializer(ModelSerializer):
             'user',
             'keypad_id',
             'seat',
+            'receiver',
             'battery_level',
             'in_range',
         )
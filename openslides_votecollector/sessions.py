@@ -0,0 +1,83 @@
+import threading
+
+from .votes import POLL_MODELS
+
+
+class VotingSession:
+    """
+    The voting of one poll in one room (VoteCollector). The key of the
+    session is part of the callback URLs, so callbacks know their room and
+    poll without reading the VoteCollector object and several rooms can
+    receive votes at the same time.
+    """
+    def __init__(self, room_id, voting_mode, poll_id):
+        self.room_id = room_id
+        self.voting_mode = voting_mode
+        self.poll_model, self.conn_model = POLL_MODELS[voting_mode]
+        self.poll_id = poll_id
+        self.key = get_session_key(room_id, voting_mode, poll_id)
+
+    def poll_exists(self):
+        return self.poll_model.objects.filter(pk=self.poll_id).exists()
+
+
+def get_session_key(room_id, voting_mode, poll_id):
+    return '%d-%s-%d' % (int(room_id), voting_mode.lower(), int(poll_id))
+
+
+def parse_session_key(key):
+    """
+    Returns the room id, the voting mode and the poll id of the session key.
+    Raises ValueError if the key is invalid.
+    """
+    room_id, model_name, poll_id = key.split('-')
+    for voting_mode in POLL_MODELS:
+        if voting_mode.lower() == model_name:
+            return int(room_id), voting_mode, int(poll_id)
+    raise ValueError('Unknown voting mode %s.' % model_name)
+
+
+class SessionRegistry:
+    """
+    In-memory registry of the voting sessions started by this process.
+    Sessions of other processes are built from their key, so callbacks do
+    not need a query. Votes of deleted polls are dropped when they are
+    written (see votes.apply_entries).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    def start(self, room_id, voting_mode, poll_id):
+        """
+        Registers and returns the session for the poll. A previous session
+        of the room is dropped.
+        """
+        session = VotingSession(room_id, voting_mode, poll_id)
+        with self.lock:
+            self.sessions = {
+                key: other for key, other in self.sessions.items() if other.room_id != room_id}
+            self.sessions[session.key] = session
+        return session
+
+    def stop(self, room_id):
+        with self.lock:
+            self.sessions = {
+                key: session for key, session in self.sessions.items() if session.room_id != room_id}
+
+    def get(self, key):
+        """
+        Returns the session with the given key or None if the key is
+        invalid.
+        """
+        try:
+            return self.sessions[key]
+        except KeyError:
+            pass
+        try:
+            return VotingSession(*parse_session_key(key))
+        except ValueError:
+            return None
+
+
+voting_sessions = SessionRegistry()
@@ -3,6 +3,7 @@ from django.contrib.contenttypes.models import ContentType
 
 from openslides.users.models import Group
 
+from .cache import candidate_index, keypad_roster, seating_plan_snapshot
 from .models import Seat
 from .seating_plan import setup_default_plan
 
@@ -31,3 +32,45 @@ def add_default_seating_plan(**kwargs):
         # Do nothing if there are seats in the database
         return
     setup_default_plan()
+
+
+def invalidate_candidate_index(sender, instance, **kwargs):
+    """
+    Drops the key to candidate index of a poll if one of its options changed.
+    """
+    candidate_index.invalidate(instance.poll_id)
+
+
+def invalidate_seating_plan_snapshot(sender, **kwargs):
+    """
+    Drops the seating plan snapshot if a seat, keypad or user changed.
+    """
+    seating_plan_snapshot.invalidate()
+
+
+def update_keypad_roster_on_keypad_save(sender, instance, raw=False, **kwargs):
+    """
+    Updates the roster of eligible keypads if a keypad changed.
+    """
+    if raw:
+        keypad_roster.invalidate()
+    else:
+        keypad_roster.update_keypad(instance)
+
+
+def update_keypad_roster_on_keypad_delete(sender, instance, **kwargs):
+    keypad_roster.remove_keypad(instance)
+
+
+def update_keypad_roster_on_user_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Updates the roster of eligible keypads if the presence of a user changed.
+    """
+    if raw:
+        keypad_roster.invalidate()
+    elif update_fields is None or 'is_present' in update_fields:
+        keypad_roster.update_user(instance)
+
+
+def update_keypad_roster_on_user_delete(sender, instance, **kwargs):
+    keypad_roster.remove_user(instance)
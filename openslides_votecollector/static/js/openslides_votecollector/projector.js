@@ -54,12 +54,25 @@ angular.module('OpenSlidesApp.openslides_votecollector.projector', ['OpenSlidesA
     'MotionPollFinder',
     'SeatingPlan',
     'User',
-    function ($scope, Config, Motion, Keypad, Seat, MotionPollKeypadConnection, MotionPollFinder, SeatingPlan, User) {
+    'VoteCollector',
+    function ($scope, Config, Motion, Keypad, Seat, MotionPollKeypadConnection, MotionPollFinder, SeatingPlan, User,
+              VoteCollector) {
         // Attention! Each object that is used here has to be dealt on server side.
         // Add it to the coresponding get_requirements method of the ProjectorElement
         // class.
         var pollId = $scope.element.id;
         var result = MotionPollFinder.find(Motion.getAll(), pollId);
+        var setLiveTally = function (vc, model) {
+            var tally = vc ? vc.live_tally : undefined;
+            if (tally && tally.model == model && tally.poll_id == pollId) {
+                $scope.votes_received = tally.votes_received;
+                $scope.liveVotes = {
+                    yes: tally.votes.Y || 0,
+                    no: tally.votes.N || 0,
+                    abstain: tally.votes.A || 0
+                };
+            }
+        };
         $scope.$watch(function () {
             return Motion.lastModified(result.motion.id);
                 // + Agenda.lastModified(result.motion.agenda_item_id);
@@ -71,6 +84,7 @@ angular.module('OpenSlidesApp.openslides_votecollector.projector', ['OpenSlidesA
 
         $scope.$watch(function () {
             return MotionPollKeypadConnection.lastModified() +
+                    VoteCollector.lastModified() +
                     Keypad.lastModified() +
                     Seat.lastModified() +
                     User.lastModified() +
@@ -129,6 +143,11 @@ angular.module('OpenSlidesApp.openslides_votecollector.projector', ['OpenSlidesA
                     $scope.votes_received += 1;
                 }
             });
+            // Use live tally of the room which counts this poll. Else the votes
+            // counted above are used (sent if seating plan or live voting is on).
+            _.forEach(VoteCollector.getAll(), function (vc) {
+                setLiveTally(vc, 'MotionPoll');
+            });
             // Generate seating plan with votes
             $scope.seatingPlanTable = SeatingPlan.generateHTML(seats, votes, $scope.poll);
         });
@@ -145,12 +164,25 @@ angular.module('OpenSlidesApp.openslides_votecollector.projector', ['OpenSlidesA
     'AssignmentPollKeypadConnection',
     'AssignmentPollFinder',
     'SeatingPlan',
-    function ($scope, Config, Assignment, Keypad, Seat, User, AssignmentPollKeypadConnection, AssignmentPollFinder, SeatingPlan) {
+    'VoteCollector',
+    function ($scope, Config, Assignment, Keypad, Seat, User, AssignmentPollKeypadConnection, AssignmentPollFinder, SeatingPlan,
+              VoteCollector) {
         // Attention! Each object that is used here has to be dealt on server side.
         // Add it to the coresponding get_requirements method of the ProjectorElement
         // class.
         var pollId = $scope.element.id;
         var result = AssignmentPollFinder.find(Assignment.getAll(), pollId);
+        var setLiveTally = function (vc, model) {
+            var tally = vc ? vc.live_tally : undefined;
+            if (tally && tally.model == model && tally.poll_id == pollId) {
+                $scope.votes_received = tally.votes_received;
+                $scope.liveVotes = {
+                    yes: tally.votes.Y || 0,
+                    no: tally.votes.N || 0,
+                    abstain: tally.votes.A || 0
+                };
+            }
+        };
         $scope.$watch(function () {
             return Assignment.lastModified(result.assignment_id);
                 // + Agenda.lastModified(result.motion.agenda_item_id);
@@ -165,6 +197,7 @@ angular.module('OpenSlidesApp.openslides_votecollector.projector', ['OpenSlidesA
 
         $scope.$watch(function () {
             return AssignmentPollKeypadConnection.lastModified() +
+                    VoteCollector.lastModified() +
                     Keypad.lastModified() +
                     Seat.lastModified() +
                     User.lastModified() +
@@ -230,6 +263,11 @@ angular.module('OpenSlidesApp.openslides_votecollector.projector', ['OpenSlidesA
                     $scope.votes_received += 1;
                 }
             });
+            // Use live tally of the room which counts this poll. Else the votes
+            // counted above are used (sent if seating plan or live voting is on).
+            _.forEach(VoteCollector.getAll(), function (vc) {
+                setLiveTally(vc, 'AssignmentPoll');
+            });
             // Generate seating plan with votes
             $scope.seatingPlanTable = SeatingPlan.generateHTML(seats, votes, $scope.poll, keys);
         });
@@ -150,6 +150,17 @@ angular.module('OpenSlidesApp.openslides_votecollector.site', [
                         ngOptions: "option.id as option.number for option in to.options | orderBy: 'id'",
                         placeholder: gettextCatalog.getString('--- Select seat ---')
                     }
+                },
+                {
+                    key: 'receiver',
+                    type: 'input',
+                    templateOptions: {
+                        label: gettextCatalog.getString('Receiver'),
+                        type: 'number',
+                        min: 1,
+                        required: true
+                    },
+                    defaultValue: 1
                 }
                 ]
             }
@@ -493,21 +504,30 @@ angular.module('OpenSlidesApp.openslides_votecollector.site', [
         // import from csv file
         $scope.import = function () {
             $scope.csvImporting = true;
-            _.forEach($scope.keypads, function (keypad) {
-                if (keypad.selected && !keypad.importerror) {
-                    var keypadobject = {
-                        'keypad_id': keypad.keypad_id,
-                        'user_id': keypad.user_id,
-                        'seat_id': keypad.seat_id
-                    }
-                    Keypad.create(keypadobject).then(
-                        function(success) {
-                            keypad.imported = true;
+            $scope.alert = {};
+            // Create all keypads with one request. The server validates them again.
+            var keypads = _.filter($scope.keypads, function (keypad) {
+                return keypad.selected && !keypad.importerror;
+            });
+            var rows = _.map(keypads, function (keypad) {
+                return _.pick(keypad, FIELDS);
+            });
+            $http.post('/rest/openslides_votecollector/keypad/import_csv/', {'rows': rows}).then(
+                function (success) {
+                    _.forEach(success.data.rows, function (row, index) {
+                        keypads[index].imported = row.imported;
+                        if (row.errors.length) {
+                            keypads[index].importerror = true;
+                            keypads[index].keypad_error = row.errors.join(' ');
                         }
-                    );
+                    });
+                    $scope.csvimported = true;
+                },
+                function (error) {
+                    $scope.csvImporting = false;
+                    $scope.alert = {type: 'danger', msg: error.data.detail, show: true};
                 }
-            });
-            $scope.csvimported = true;
+            );
         };
 
         // clear csv import preview
@@ -0,0 +1,79 @@
+from collections import defaultdict
+
+from django.db.models import Count
+
+from .cache import candidate_index
+from .models import AssignmentPollKeypadConnection, MotionPollKeypadConnection
+
+
+def get_yna_result(conn_model, poll_id):
+    """
+    Returns the number of yes, no and abstain votes of a poll as list like
+    the VoteCollector does. Uses one grouped query.
+    """
+    counts = dict(conn_model.objects.filter(poll_id=poll_id).order_by().values_list(
+        'value').annotate(count=Count('id')))
+    return [counts.get(value, 0) for value in ('Y', 'N', 'A')]
+
+
+def get_election_result(poll_id):
+    """
+    Returns the number of votes per candidate and the number of valid and
+    invalid votes of an assignment poll with pollmethod 'votes'. Uses one
+    grouped query.
+
+    Votes for an abstention or for a candidate who is not an option of the
+    poll (anymore) are invalid.
+    """
+    result = {
+        'invalid': 0,
+        'valid': 0
+    }
+    for candidate_id in candidate_index.get(poll_id):
+        result['vote_' + str(candidate_id)] = 0
+    queryset = AssignmentPollKeypadConnection.objects.filter(poll_id=poll_id).order_by().values_list(
+        'candidate_id').annotate(count=Count('id'))
+    for candidate_id, count in queryset:
+        key = 'vote_' + str(candidate_id)
+        if candidate_id is not None and key in result:
+            result[key] = count
+            result['valid'] += count
+        else:
+            result['invalid'] += count
+    return result
+
+
+def get_tally_key(value, candidate_id=None):
+    """
+    Returns the key of a vote in the live tally: 'Y', 'N' or 'A' for
+    yes/no/abstain votings, 'vote_<candidate_id>' or 'invalid' for
+    elections.
+    """
+    if value in ('Y', 'N', 'A'):
+        return value
+    if candidate_id is None:
+        return 'invalid'
+    return 'vote_' + str(candidate_id)
+
+
+def get_poll_tally(voting_mode, poll_id):
+    """
+    Returns the tally of a poll for clients and projectors or None if
+    voting_mode is not a poll. The votes are counted by the database with one grouped
+    query, so the votes written by all processes are included.
+    """
+    if voting_mode == 'MotionPoll':
+        queryset = MotionPollKeypadConnection.objects.values_list('value')
+    elif voting_mode == 'AssignmentPoll':
+        queryset = AssignmentPollKeypadConnection.objects.values_list('value', 'candidate_id')
+    else:
+        return None
+    votes = defaultdict(int)
+    for row in queryset.filter(poll_id=poll_id).exclude(keypad=None).order_by().annotate(count=Count('id')):
+        votes[get_tally_key(*row[:-1])] += row[-1]
+    return {
+        'model': voting_mode,
+        'poll_id': int(poll_id),
+        'votes': dict(votes),
+        'votes_received': sum(votes.values()),
+    }
@@ -2,6 +2,7 @@ from django.conf.urls import url
 from django.views.decorators.csrf import csrf_exempt
 
 from . import views
+from .capture import capture_callback
 
 urlpatterns = [
     url(r'^votecollector/device/$',
@@ -82,6 +83,14 @@ urlpatterns = [
         views.VotingStatus.as_view(),
         name='votecollector_status'),
 
+    url(r'^votecollector/live/$',
+        views.LiveTally.as_view(),
+        name='votecollector_live'),
+
+    url(r'^votecollector/queue/$',
+        views.QueueStatus.as_view(),
+        name='votecollector_queue'),
+
     url(r'^votecollector/result_voting/(?P<id>\d+)/$',
         views.VotingResult.as_view(), {
             'app': 'motions',
@@ -97,30 +106,46 @@ urlpatterns = [
         name='votecollector_result_election'),
 
     url(r'^votecollector/vote/(?P<poll_id>\d+)/$',
-        csrf_exempt(views.Votes.as_view()),
+        csrf_exempt(capture_callback(views.Votes.as_view())),
         name='votecollector_votes'),
 
     url(r'^votecollector/vote/(?P<poll_id>\d+)/(?P<keypad_id>\d+)/$',
-        csrf_exempt(views.VoteCallback.as_view()),
+        csrf_exempt(capture_callback(views.VoteCallback.as_view())),
         name='votecollector_vote'),
 
     url(r'^votecollector/candidate/(?P<poll_id>\d+)/$',
-        csrf_exempt(views.Candidates.as_view()),
+        csrf_exempt(capture_callback(views.Candidates.as_view())),
         name='votecollector_candidates'),
 
     url(r'^votecollector/candidate/(?P<poll_id>\d+)/(?P<keypad_id>\d+)/$',
-        csrf_exempt(views.CandidateCallback.as_view()),
+        csrf_exempt(capture_callback(views.CandidateCallback.as_view())),
         name='votecollector_candidate'),
 
+    url(r'^votecollector/session/(?P<session>\d+-[a-z]+-\d+)/vote/$',
+        csrf_exempt(capture_callback(views.Votes.as_view())),
+        name='votecollector_session_votes'),
+
+    url(r'^votecollector/session/(?P<session>\d+-[a-z]+-\d+)/vote/(?P<keypad_id>\d+)/$',
+        csrf_exempt(capture_callback(views.VoteCallback.as_view())),
+        name='votecollector_session_vote'),
+
+    url(r'^votecollector/session/(?P<session>\d+-[a-z]+-\d+)/candidate/$',
+        csrf_exempt(capture_callback(views.Candidates.as_view())),
+        name='votecollector_session_candidates'),
+
+    url(r'^votecollector/session/(?P<session>\d+-[a-z]+-\d+)/candidate/(?P<keypad_id>\d+)/$',
+        csrf_exempt(capture_callback(views.CandidateCallback.as_view())),
+        name='votecollector_session_candidate'),
+
     url(r'^votecollector/speaker/(?P<item_id>\d+)/(?P<keypad_id>\d+)/$',
-        csrf_exempt(views.SpeakerCallback.as_view()),
+        csrf_exempt(capture_callback(views.SpeakerCallback.as_view())),
         name='votecollector_speaker'),
 
     url(r'^votecollector/keypad/$',
-        csrf_exempt(views.Keypads.as_view()),
+        csrf_exempt(capture_callback(views.Keypads.as_view())),
         name='votecollector_keypads'),
 
     url(r'^votecollector/keypad/(?P<keypad_id>\d+)/$',
-        csrf_exempt(views.KeypadCallback.as_view()),
+        csrf_exempt(capture_callback(views.KeypadCallback.as_view())),
         name='votecollector_keypad'),
 ]
@@ -0,0 +1,100 @@
+import math
+import threading
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Case, Value, When
+
+
+def bulk_update(model, instances, fields):
+    """
+    Writes the given fields of all instances with one UPDATE query per
+    batch. The batch size respects the limit of query parameters of the
+    database like bulk_create does.
+
+    Instances sharing the same value are grouped into one WHEN clause so
+    that low cardinality fields like battery_level stay small. Returns the
+    number of updated rows. Attention: This does not trigger an autoupdate.
+    """
+    instances = [instance for instance in instances if instance.pk is not None]
+    if not instances:
+        return 0
+
+    model_fields = [model._meta.get_field(field_name) for field_name in fields]
+    # Every instance needs up to two parameters per field (its pk in the
+    # WHEN clause and its value) and its pk for the WHERE clause.
+    batch_size = max(connection.ops.bulk_batch_size(['pk'] + model_fields * 2, instances), 1)
+    updated = 0
+    for start in range(0, len(instances), batch_size):
+        batch = instances[start:start + batch_size]
+        values = {}
+        for field in model_fields:
+            groups = defaultdict(list)
+            for instance in batch:
+                groups[getattr(instance, field.attname)].append(instance.pk)
+            output_field = field.target_field if field.is_relation else field
+            values[field.name] = Case(
+                *[When(pk__in=pks, then=Value(value, output_field=output_field)) for value, pks in groups.items()],
+                output_field=output_field)
+        updated += model.objects.filter(pk__in=[instance.pk for instance in batch]).update(**values)
+    return updated
+
+
+def percentile(values, percent):
+    """
+    Returns the percentile of the values with the nearest rank method.
+    """
+    values = sorted(values)
+    return values[max(int(math.ceil(percent / 100 * len(values))) - 1, 0)]
+
+
+class WriteBehindBuffer:
+    """
+    Base class for in-memory buffers which are written to the database
+    delayed, at most once per interval.
+
+    Subclasses collect their data under self.lock, call schedule() and
+    implement flush(). flush() may also be called directly to write the
+    buffer synchronously, e. g. when a voting stops.
+    """
+    interval = 1.0
+
+    def __init__(self, interval=None):
+        if interval is not None:
+            self.interval = interval
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def get_interval(self):
+        """
+        Returns the flush interval in seconds.
+        """
+        return self.interval
+
+    def schedule(self):
+        """
+        Starts the flush timer if it is not running yet. Has to be called
+        with self.lock held.
+        """
+        if self.timer is None:
+            self.timer = threading.Timer(self.get_interval(), self.run_timer)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def cancel(self):
+        """
+        Stops the flush timer. Has to be called with self.lock held.
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def run_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread got its own database connection.
+            connection.close()
+
+    def flush(self):
+        raise NotImplementedError
@@ -2,7 +2,7 @@ import json
 
 from django.apps import apps
 from django.db import transaction
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import PermissionDenied, ValidationError as DjangoValidationError
 from django.http import HttpResponse
 from django.utils.translation import ugettext as _
 from rest_framework.viewsets import ReadOnlyModelViewSet
@@ -16,14 +16,25 @@ from openslides.motions.models import MotionPoll
 from openslides.utils import views as utils_views
 from openslides.utils.auth import has_perm
 from openslides.utils.autoupdate import inform_changed_data, inform_deleted_data
-from openslides.utils.rest_api import ListModelMixin, ModelViewSet, PermissionMixin, RetrieveModelMixin, Response, list_route
+from openslides.utils.rest_api import (
+    ListModelMixin,
+    ModelViewSet,
+    PermissionMixin,
+    RetrieveModelMixin,
+    Response,
+    ValidationError,
+    list_route,
+)
 
 from .api import (
-    get_device_status,
+    device_poller,
+    get_clients,
     get_voting_result,
-    get_voting_status,
+    join_device_statuses,
+    join_voting_statuses,
     start_voting,
     stop_voting,
+    VoteCollectorConnectionError,
     VoteCollectorError
 )
 from .access_permissions import (
@@ -33,7 +44,75 @@ from .access_permissions import (
     SeatAccessPermissions,
     VoteCollectorAccessPermissions,
 )
+from .buffers import autoupdate_buffer, keypad_telemetry, voting_progress
+from .cache import candidate_index, connection_index, keypad_roster, seating_plan_snapshot
+from .ingest import queue_votes, vote_queue
+from .journal import store_votes, vote_journal
+from .keypad_import import import_keypads, read_keypads
 from .models import AssignmentPollKeypadConnection, Keypad, MotionPollKeypadConnection, Seat, VoteCollector
+from .seating_plan import generate_seats, import_seats, parse_seats, read_seats
+from .sessions import VotingSession, get_session_key, voting_sessions
+from .tally import get_election_result, get_poll_tally, get_yna_result
+from .votes import POLL_MODELS
+
+
+def get_keypads_by_keypad_id(keypad_ids):
+    """
+    Returns a dict of all registered keypads with the given device keypad ids
+    using one query.
+    """
+    return {keypad.keypad_id: keypad for keypad in Keypad.objects.filter(keypad_id__in=set(keypad_ids))}
+
+
+def get_voting_session(session_key=None, poll_id=None, voting_mode=None):
+    """
+    Returns the voting session of a callback or None if the session key is
+    invalid or does not match the voting mode. Callback URLs without a
+    session key belong to the default room and by default to its voting
+    mode.
+    """
+    if session_key is not None:
+        session = voting_sessions.get(session_key)
+        if session is None or voting_mode not in (None, session.voting_mode):
+            return None
+        return session
+    if voting_mode is None:
+        voting_mode = VoteCollector.objects.get(id=1).voting_mode
+    if voting_mode not in POLL_MODELS:
+        # Anything but a motion poll was an assignment poll.
+        voting_mode = 'AssignmentPoll'
+    return VotingSession(1, voting_mode, int(poll_id))
+
+
+def get_room_receivers(vc, count):
+    """
+    Returns the indexes of the receivers of the room for the given number
+    of configured receivers. Raises VoteCollectorError if there are none.
+    """
+    try:
+        receivers = vc.get_receivers(count)
+    except ValueError:
+        receivers = []
+    if not receivers:
+        raise VoteCollectorError(_('The room has no receivers.'))
+    return receivers
+
+
+def get_free_receivers(vc):
+    """
+    Returns the receivers of the room. Raises VoteCollectorError if another
+    room is voting on one of them.
+    """
+    count = len(get_clients())
+    receivers = get_room_receivers(vc, count)
+    for other in VoteCollector.objects.filter(is_voting=True).exclude(pk=vc.pk):
+        try:
+            busy = other.get_receivers(count)
+        except ValueError:
+            continue
+        if set(busy) & set(receivers):
+            raise VoteCollectorError(_('Another room is voting on the receivers of this room.'))
+    return receivers
 
 
 class AjaxView(utils_views.View):
@@ -83,12 +162,21 @@ class AjaxView(utils_views.View):
 
 class VotecollectorViewSet(ModelViewSet):
     access_permissions = VoteCollectorAccessPermissions()
-    http_method_names = ['get', 'head', 'options']
     queryset = VoteCollector.objects.all()
 
     def check_view_permissions(self):
         return has_perm(self.request.user, 'openslides_votecollector.can_manage')
 
+    def destroy(self, request, *args, **kwargs):
+        """
+        Deletes a room. The default room and rooms with an active voting can
+        not be deleted.
+        """
+        vc = self.get_object()
+        if vc.pk == 1 or vc.is_voting:
+            raise ValidationError({'detail': _('This room can not be deleted.')})
+        return super().destroy(request, *args, **kwargs)
+
 
 class SeatViewSet(ModelViewSet):
     access_permissions = SeatAccessPermissions()
@@ -97,6 +185,40 @@ class SeatViewSet(ModelViewSet):
     def check_view_permissions(self):
         return self.get_access_permissions().check_permissions(self.request.user)
 
+    @list_route(methods=['post'])
+    def import_layout(self, request):
+        """
+        Imports a seating plan from an uploaded CSV or JSON file (file), a
+        layout description (layout) or a list of seats (seats). All seats
+        are validated in memory and created with one query. Existing seats
+        are deleted before if replace is true.
+        """
+        try:
+            if 'file' in request.FILES:
+                file = request.FILES['file']
+                file_format = 'csv' if file.name.lower().endswith('.csv') else 'json'
+                seats = read_seats(file, file_format)
+            elif isinstance(request.data.get('layout'), dict):
+                seats = generate_seats(request.data['layout'])
+            elif isinstance(request.data.get('seats'), list):
+                seats = parse_seats(request.data['seats'])
+            else:
+                raise ValidationError({'detail': _('No seating plan given.')})
+            replace = request.data.get('replace') in (True, 'true', '1')
+            deleted_seats = list(Seat.objects.values_list('pk', flat=True)) if replace else []
+            count = import_seats(seats, replace=replace)
+        except DjangoValidationError as e:
+            raise ValidationError({'detail': ' '.join(e.messages)})
+
+        # Trigger one autoupdate for all seats (and keypads if their seats
+        # were deleted). Bulk queries do not send signals.
+        seating_plan_snapshot.invalidate()
+        if deleted_seats:
+            inform_deleted_data([(Seat.get_collection_string(), pk) for pk in deleted_seats])
+            inform_changed_data(Keypad.objects.all())
+        inform_changed_data(Seat.objects.all())
+        return Response({'detail': _('%d seats successfully imported.') % count})
+
 
 class KeypadViewSet(ModelViewSet):
     access_permissions = KeypadAccessPermissions()
@@ -105,46 +227,121 @@ class KeypadViewSet(ModelViewSet):
     def check_view_permissions(self):
         return self.get_access_permissions().check_permissions(self.request.user)
 
+    @list_route(methods=['post'])
+    def import_csv(self, request):
+        """
+        Imports keypads from an uploaded CSV file (file) or a list of rows
+        (rows). Users and seats are resolved by name and seat label. All
+        valid keypads are created in one transaction, rows with errors are
+        skipped. Returns a report per row. Nothing is created if dry_run
+        is true.
+        """
+        if 'file' in request.FILES:
+            data = read_keypads(request.FILES['file'])
+        elif isinstance(request.data.get('rows'), list):
+            data = request.data['rows']
+            if not all(isinstance(row, dict) for row in data):
+                raise ValidationError({'detail': _('Invalid keypad rows.')})
+        else:
+            raise ValidationError({'detail': _('No keypads given.')})
+        dry_run = request.data.get('dry_run') in (True, 'true', '1')
+        try:
+            report = import_keypads(data, dry_run=dry_run)
+        except UnicodeDecodeError:
+            raise ValidationError({'detail': _('The file has to be UTF-8 encoded.')})
+
+        keypad_ids = [row['keypad_id'] for row in report if row['imported']]
+        if keypad_ids:
+            # Trigger one autoupdate for all keypads. bulk_create does not send signals.
+            keypad_roster.invalidate()
+            seating_plan_snapshot.invalidate()
+            inform_changed_data(Keypad.objects.filter(keypad_id__in=keypad_ids))
+        return Response({
+            'detail': _('%d keypads successfully imported.') % len(keypad_ids),
+            'rows': report})
+
+
+class AnonymizeVotesMixin:
+    """
+    Mixin for keypad connection viewsets to anonymize votes with one update
+    query and one auto update.
+    """
+    # Name of the lookup from a connection to the motion or assignment.
+    parent_lookup = None
+    # Voting mode of the VoteCollector for the polls of this viewset.
+    voting_mode = None
 
-class MotionPollKeypadConnectionViewSet(PermissionMixin, ListModelMixin, RetrieveModelMixin, ReadOnlyModelViewSet):
-    access_permissions = MotionPollKeypadConnectionAccessPermissions()
-    queryset = MotionPollKeypadConnection.objects.all()
-
-    def check_view_permissions(self):
-        return self.get_access_permissions().check_permissions(self.request.user)
+    def get_active_poll_ids(self):
+        """
+        Returns the ids of the polls of this viewset with an active voting
+        in any room.
+        """
+        return list(VoteCollector.objects.filter(
+            is_voting=True, voting_mode=self.voting_mode).values_list('voting_target', flat=True))
+
+    def anonymize(self, queryset):
+        # Lock and load the votes for the autoupdate, clear their keypad id
+        # with one query and trigger one autoupdate.
+        queryset = queryset.exclude(keypad=None)
+        connections = list(queryset.select_for_update())
+        queryset.update(keypad=None)
+        for connection in connections:
+            connection.keypad = None
+        inform_changed_data(connections)
+        return Response({'detail': _('All votes are successfully anonymized.')})
 
     @list_route(methods=['post'])
     @transaction.atomic
     def anonymize_votes(self, request):
         """
-        Anonymize all votes of the given poll.
+        Anonymize all votes of the given poll. Votes of a poll with an active
+        voting can not be anonymized.
         """
-        # Clear keypad id and save model to trigger autoupdate.
-        for mpkc in MotionPollKeypadConnection.objects.filter(poll_id=request.data.get('poll_id')):
-            mpkc.keypad_id = None
-            mpkc.save()
-        return Response({'detail': _('All votes are successfully anonymized.')})
+        poll_id = request.data.get('poll_id')
+        if str(poll_id) in map(str, self.get_active_poll_ids()):
+            raise ValidationError({'detail': _('Votes can not be anonymized during the voting.')})
+        return self.anonymize(self.queryset.filter(poll_id=poll_id))
+
+    @list_route(methods=['post'])
+    @transaction.atomic
+    def anonymize_polls(self, request):
+        """
+        Anonymize all votes of the given polls (poll_ids) or of all polls
+        of the given motion or assignment (parent_id) except the polls with
+        an active voting.
+        """
+        if request.data.get('poll_ids') is not None:
+            if not isinstance(request.data['poll_ids'], list):
+                raise ValidationError({'detail': _('Invalid poll ids.')})
+            queryset = self.queryset.filter(poll_id__in=request.data['poll_ids'])
+        elif request.data.get('parent_id') is not None:
+            queryset = self.queryset.filter(**{self.parent_lookup: request.data['parent_id']})
+        else:
+            raise ValidationError({'detail': _('No polls given.')})
+        return self.anonymize(queryset.exclude(poll_id__in=self.get_active_poll_ids()))
+
+
+class MotionPollKeypadConnectionViewSet(AnonymizeVotesMixin, PermissionMixin, ListModelMixin, RetrieveModelMixin,
+                                        ReadOnlyModelViewSet):
+    access_permissions = MotionPollKeypadConnectionAccessPermissions()
+    queryset = MotionPollKeypadConnection.objects.all()
+    parent_lookup = 'poll__motion_id'
+    voting_mode = 'MotionPoll'
+
+    def check_view_permissions(self):
+        return self.get_access_permissions().check_permissions(self.request.user)
 
 
-class AssignmentPollKeypadConnectionViewSet(PermissionMixin, ListModelMixin, RetrieveModelMixin, ReadOnlyModelViewSet):
+class AssignmentPollKeypadConnectionViewSet(AnonymizeVotesMixin, PermissionMixin, ListModelMixin, RetrieveModelMixin,
+                                            ReadOnlyModelViewSet):
     access_permissions = AssignmentPollKeypadConnectionAccessPermissions()
     queryset = AssignmentPollKeypadConnection.objects.all()
+    parent_lookup = 'poll__assignment_id'
+    voting_mode = 'AssignmentPoll'
 
     def check_view_permissions(self):
         return self.get_access_permissions().check_permissions(self.request.user)
 
-    @list_route(methods=['post'])
-    @transaction.atomic
-    def anonymize_votes(self, request):
-        """
-        Anonymize all votes of the given poll.
-        """
-        # Clear keypad id and save model to trigger autoupdate.
-        for apkc in AssignmentPollKeypadConnection.objects.filter(poll_id=request.data.get('poll_id')):
-            apkc.keypad_id = None
-            apkc.save()
-        return Response({'detail': _('All votes are successfully anonymized.')})
-
 
 class VotingView(AjaxView):
     """
@@ -175,6 +372,34 @@ class VotingView(AjaxView):
                 self.error = _('Unknown id.')
         return obj
 
+    def get_room(self):
+        """
+        Returns the room (VoteCollector) given by the room query parameter.
+        The default is the first room.
+        """
+        try:
+            return VoteCollector.objects.get(id=int(self.request.GET.get('room', 1)))
+        except (ValueError, VoteCollector.DoesNotExist):
+            self.error = _('Unknown room.')
+            return None
+
+    def show_on_projector(self, element):
+        """
+        Shows the voting prompt or icon of the default room on the
+        projector or removes it if element is None. Other rooms have no
+        projector.
+        """
+        if self.room.id != 1:
+            return
+        projector = Projector.objects.get(id=1)
+        if element is not None:
+            projector.config[self.voting_key] = element
+        elif self.voting_key in projector.config:
+            del projector.config[self.voting_key]
+        else:
+            return
+        projector.save(information={'votecollector_voting_msg_toggled': True})
+
     def get_ajax_context(self, **kwargs):
         """
         Return the value of the called command, or the error-message
@@ -211,51 +436,126 @@ class VotingView(AjaxView):
         if len(args) > 0:
             inform_deleted_data(args)
 
+        # Reload the connection index if it holds this poll and write the
+        # live tally.
+        def reset_voting_state():
+            if connection_index.is_active(model, poll.id):
+                connection_index.start(model, poll.id)
+            voting_progress.touch()
+        transaction.on_commit(reset_voting_state)
+
+
+class PolledStatusView(VotingView):
+    """
+    An abstract view which answers from the latest snapshot of the device
+    poller instead of requesting the VoteCollector.
+    """
+    status_key = None
+    # Function which joins the statuses of the receivers of the room.
+    join_statuses = None
 
-class DeviceStatus(VotingView):
     def get(self, request, *args, **kwargs):
         self.error = None
-        try:
-            self.result = get_device_status()
-        except VoteCollectorError as e:
-            self.error = e.value
-        return super(DeviceStatus, self).get(request, *args, **kwargs)
+        self.room = self.get_room()
+        self.snapshot = device_poller.get_snapshot()
+        if self.error:
+            pass
+        elif self.snapshot is None:
+            self.error = _('No connection to VoteCollector.')
+        elif self.snapshot[self.status_key + '_error']:
+            self.error = self.snapshot[self.status_key + '_error']
+        else:
+            statuses = self.snapshot[self.status_key + '_status']
+            errors = self.snapshot[self.status_key + '_errors']
+            try:
+                receivers = get_room_receivers(self.room, len(statuses))
+            except VoteCollectorError as e:
+                self.error = e.value
+            else:
+                self.error = next((errors[receiver] for receiver in receivers if errors[receiver]), None)
+                if not self.error:
+                    self.result = self.join_statuses([statuses[receiver] for receiver in receivers])
+        return super(PolledStatusView, self).get(request, *args, **kwargs)
+
+    def get_ajax_context(self, **kwargs):
+        context = super(PolledStatusView, self).get_ajax_context(**kwargs)
+        if self.snapshot is not None:
+            # Time of the snapshot in seconds since the epoch.
+            context['timestamp'] = self.snapshot['timestamp']
+        return context
+
+
+class DeviceStatus(PolledStatusView):
+    status_key = 'device'
+    join_statuses = staticmethod(join_device_statuses)
 
     def no_error_context(self):
         return {
             'device': self.result,
-            'connected': not self.result.startswith('Device: None')
+            # The status of several receivers is joined (see api.py).
+            'connected': 'Device: None' not in self.result,
+            'queue': vote_queue.get_status()
         }
 
 
+class QueueStatus(VotingView):
+    """
+    Returns the number of votes which are not written to the database yet
+    and the age of the oldest one in seconds (see ingest.py).
+    """
+    def get(self, request, *args, **kwargs):
+        self.error = None
+        return super(QueueStatus, self).get(request, *args, **kwargs)
+
+    def no_error_context(self):
+        return vote_queue.get_status()
+
+
 class StartVoting(VotingView):
     def get(self, request, *args, **kwargs):
         mode = kwargs['mode']
         resource = kwargs['resource']
         obj = self.get_poll_object()
-        vc = VoteCollector.objects.get(id=1)
+        vc = self.room = self.get_room()
         if not self.error:
-            # Stop any active voting no matter what mode.
-            if vc.is_voting:
-                try:
-                    stop_voting()
-                except VoteCollectorError as e:
-                    pass
+            # Write votes which were left in the journal by a stopped process.
+            vote_journal.recover()
             target = obj.id if obj else 0
-            url = self.get_callback_url(request) + resource
-            if target:
-                url += '%s/' % target
+            is_poll = isinstance(obj, (MotionPoll, AssignmentPoll))
+            if is_poll:
+                # Votes of polls are sent to the session of the room and poll.
+                url = self.get_callback_url(request) + '/session/%s' % get_session_key(
+                    vc.id, kwargs['model'], target) + resource
+            else:
+                url = self.get_callback_url(request) + resource
+                if target:
+                    url += '%s/' % target
             try:
-                self.result = start_voting(mode, kwargs.get('options'), url)
+                receivers = get_free_receivers(vc)
+                # Stop any active voting of this room no matter what mode.
+                self.result = start_voting(
+                    mode, kwargs.get('options'), url, stop=vc.is_voting, receivers=receivers)
             except VoteCollectorError as e:
                 self.error = e.value
             else:
+                voting_progress.discard(vc.id)
+                # Register the session and index the connections of polls.
+                if is_poll:
+                    session = voting_sessions.start(vc.id, kwargs['model'], target)
+                    connection_index.start(session.conn_model, target)
+                else:
+                    voting_sessions.stop(vc.id)
+                # The circuit breakers may have changed the connection state
+                # meanwhile (see api.py).
+                vc.refresh_from_db(fields=['connection_state'])
                 vc.voting_mode = kwargs.get('model', 'Test')
                 vc.voting_target = target
                 vc.voters_count = self.result
                 vc.votes_received = 0
                 vc.is_voting = True
-                vc.save()
+                vc.live_tally = get_poll_tally(vc.voting_mode, target) or {}
+                vc.save(update_fields=[
+                    'voting_mode', 'voting_target', 'voters_count', 'votes_received', 'is_voting', 'live_tally'])
                 self.on_start(obj)
         return super(StartVoting, self).get(request, *args, **kwargs)
 
@@ -275,8 +575,7 @@ class StartYNA(StartVoting):
             candidate_str = "<div class='spacer candidate'>" + str(candidate) + "</div>"
 
         # Show voting prompt on projector.
-        projector = Projector.objects.get(id=1)
-        projector.config[self.voting_key] = {
+        self.show_on_projector({
             'name': 'voting/prompt',
             'message' : _(config['votecollector_vote_started_msg']) +
                 "<br>" +
@@ -286,8 +585,7 @@ class StartYNA(StartVoting):
                 candidate_str,
             'visible': True,
             'stable': True
-        }
-        projector.save(information={'votecollector_voting_msg_toggled': True})
+        })
 
 
 class StartElection(StartVoting):
@@ -295,7 +593,9 @@ class StartElection(StartVoting):
         # Get candidate names (if is an election with >1 candidate)
         candidate_str = ''
         if (type(poll) == AssignmentPoll):
-            options = AssignmentOption.objects.filter(poll=poll).order_by('weight').all()
+            options = AssignmentOption.objects.filter(poll=poll).order_by('weight').select_related('candidate')
+            # Build the key to candidate index used by the callbacks.
+            candidate_index.set(poll.id, [option.candidate_id for option in options])
             candidate_str += "<div><ul class='columns' data-columns='3'>"
             for index, option in enumerate(options):
                 candidate_str += \
@@ -306,56 +606,59 @@ class StartElection(StartVoting):
             candidate_str += "</ul></div>"
 
         # Show voting prompt on projector.
-        projector = Projector.objects.get(id=1)
-        projector.config[self.voting_key] = {
+        self.show_on_projector({
             'name': 'voting/prompt',
             'message': _(config['votecollector_vote_started_msg']) +
                 "<br>" + candidate_str,
             'visible': True,
             'stable': True
-        }
-        projector.save(information={'votecollector_voting_msg_toggled': True})
+        })
 
 
 class StartSpeakerList(StartVoting):
     def on_start(self, item):
         # Show voting icon on projector.
-        projector = Projector.objects.get(id=1)
-        projector.config[self.voting_key] = {
+        self.show_on_projector({
             'name': 'voting/icon',
             'stable': True
-        }
-        projector.save(information={'votecollector_voting_msg_toggled': True})
+        })
 
 
 class StartPing(StartVoting):
     def on_start(self, obj):
         # Clear in_range and battery_level of all keypads.
+        keypad_telemetry.discard()
         Keypad.objects.all().update(in_range=False, battery_level=-1)
+        seating_plan_snapshot.invalidate()
         # We intentionally do not trigger an autoupdate.
 
 
 class StopVoting(VotingView):
     def get(self, request, *args, **kwargs):
         self.error = None
+        vc = self.room = self.get_room()
+        if self.error:
+            return super(StopVoting, self).get(request, *args, **kwargs)
 
         # Remove voting prompt from projector.
-        projector = Projector.objects.get(id=1)
-        try:
-            del projector.config[self.voting_key]
-        except KeyError:
-            pass
-        else:
-            projector.save(information={'votecollector_voting_msg_toggled': True})
+        self.show_on_projector(None)
 
         try:
-            self.result = stop_voting()
+            self.result = stop_voting(get_room_receivers(vc, len(get_clients())))
         except VoteCollectorError as e:
             self.error = e.value
+        # Write pending votes (also those left in the journal by a stopped
+        # process), keypad states and voting progress and send all pending
+        # auto updates.
+        vote_journal.recover()
+        vote_queue.drain()
+        vote_journal.drain()
+        keypad_telemetry.flush()
+        voting_progress.flush()
+        autoupdate_buffer.flush()
         # Attention: We purposely set is_voting to False even if stop_voting fails.
-        vc = VoteCollector.objects.get(id=1)
         vc.is_voting = False
-        vc.save()
+        vc.save(update_fields=['is_voting'])
         return super(StopVoting, self).get(request, *args, **kwargs)
 
     def no_error_context(self):
@@ -372,48 +675,56 @@ class ClearVotes(VotingView):
         return super(ClearVotes,self).get(request, *args, **kwargs)
 
 
-class VotingStatus(VotingView):
-    def get(self, request, *args, **kwargs):
-        self.error = None
-        try:
-            self.result = get_voting_status()
-        except VoteCollectorError as e:
-            self.error = e.value
-        return super(VotingStatus, self).get(request, *args, **kwargs)
+class VotingStatus(PolledStatusView):
+    status_key = 'voting'
+    join_statuses = staticmethod(join_voting_statuses)
 
     def no_error_context(self):
         import time
+        elapsed, votes_received = self.result[0], self.result[1]
+        # The single vote callbacks report the progress without waiting for
+        # the next poll of the device.
+        progress = voting_progress.get(self.room.id)
+        if progress is not None:
+            votes_received = max(votes_received, progress[0])
+            elapsed = max(elapsed, progress[1])
         return {
-            'elapsed': time.strftime('%M:%S', time.gmtime(self.result[0])),
-            'votes_received': self.result[1]
+            'elapsed': time.strftime('%M:%S', time.gmtime(elapsed)),
+            'votes_received': votes_received
         }
 
 
+class LiveTally(VotingView):
+    def get(self, request, *args, **kwargs):
+        self.error = None
+        self.room = self.get_room()
+        return super(LiveTally, self).get(request, *args, **kwargs)
+
+    def no_error_context(self):
+        # Count the votes of all processes.
+        return get_poll_tally(self.room.voting_mode, self.room.voting_target) or {}
+
+
 class VotingResult(VotingView):
     def get(self, request, *args, **kwargs):
         poll = self.get_poll_object()
+        vc = self.get_room()
         if not self.error:
-            vc = VoteCollector.objects.get(id=1)
+            # Write votes which were left in the journal by a stopped process.
+            vote_journal.recover()
             if vc.voting_mode == kwargs['model'] and vc.voting_target == int(kwargs['id']):
                 if vc.voting_mode == 'AssignmentPoll' and poll.pollmethod == 'votes':
                     # Calculate vote result.
-                    self.result = {
-                        'invalid': 0,
-                        'valid': 0
-                    }
-                    for option in poll.get_options().all():
-                        self.result['vote_' + str(option.candidate_id)] = 0
-                    for conn in AssignmentPollKeypadConnection.objects.filter(poll_id=vc.voting_target):
-                        key = 'vote_' + str(conn.candidate_id)
-                        if conn.candidate and key in self.result:
-                            self.result[key] += 1
-                            self.result['valid'] += 1
-                        else:
-                            self.result['invalid'] += 1
+                    self.result = get_election_result(poll.id)
                 else:
                     # Get vote result from votecollector.
                     try:
-                        self.result = get_voting_result()
+                        self.result = get_voting_result(get_room_receivers(vc, len(get_clients())))
+                    except VoteCollectorConnectionError:
+                        # Calculate vote result from the received votes.
+                        conn_model = MotionPollKeypadConnection if vc.voting_mode == 'MotionPoll' \
+                            else AssignmentPollKeypadConnection
+                        self.result = get_yna_result(conn_model, poll.id)
                     except VoteCollectorError as e:
                         self.error = e.value
             else:
@@ -436,83 +747,62 @@ class VotingCallbackView(utils_views.View):
         except Keypad.DoesNotExist:
             return None
 
-        # Mark keypad as in range and update battery level.
-        keypad.in_range = True
-        keypad.battery_level = request.POST.get('battery', -1)
-        # Do not auto update here to improve performance.
-        keypad.save(skip_autoupdate=True)
+        # Mark keypad as in range and update battery level. This is written
+        # delayed to keep the keypad row out of the vote transaction.
+        keypad_telemetry.add(keypad.keypad_id, request.POST.get('battery', -1))
         return keypad
 
+    def get_keypad_pk(self, request, keypad_id):
+        """
+        Returns the database id of the keypad like post() but without a
+        query (see KeypadRoster). Returns None if the keypad is unknown.
+        """
+        keypad_pk = keypad_roster.get_keypad_pk(int(keypad_id))
+        if keypad_pk is not None:
+            keypad_telemetry.add(keypad_id, request.POST.get('battery', -1))
+        return keypad_pk
+
 
 class Votes(utils_views.View):
     http_method_names = ['post']
 
-    @transaction.atomic()
-    def post(self, request, poll_id):
-        # Get poll instance.
-        vc = VoteCollector.objects.get(id=1)
-        if vc.voting_mode == 'MotionPoll':
-            poll_model = MotionPoll
-            conn_model = MotionPollKeypadConnection
-        else:
-            poll_model = AssignmentPoll
-            conn_model = AssignmentPollKeypadConnection
-        try:
-            poll = poll_model.objects.get(id=poll_id)
-        except poll_model.DoesNotExist:
+    def post(self, request, poll_id=None, session=None):
+        # Get voting session of the poll.
+        session = get_voting_session(session, poll_id)
+        if session is None or not session.poll_exists():
             return HttpResponse('')
 
         # Load json list from request body.
         votes = json.loads(request.body.decode('utf-8'))
-        keypad_set = set()
-        connections = []
+
+        # Resolve all keypads of this batch at once.
+        keypads = get_keypads_by_keypad_id(vote['id'] for vote in votes)
+        valid_votes = []
         for vote in votes:
-            keypad_id = vote['id']
             try:
-                keypad = Keypad.objects.get(keypad_id=keypad_id)
-            except Keypad.DoesNotExist:
+                keypad = keypads[vote['id']]
+            except KeyError:
                 continue
 
             # Mark keypad as in range and update battery level.
-            keypad.in_range = True
-            keypad.battery_level = vote['bl']
-            keypad.save(skip_autoupdate=True)
+            keypad_telemetry.add(keypad.keypad_id, vote['bl'])
 
             # Validate vote value.
             value = vote['value']
             if value not in ('Y', 'N', 'A'):
                 continue
 
-            # Write poll keypad connection.
-            try:
-                conn = conn_model.objects.get(poll=poll, keypad=keypad)
-            except conn_model.DoesNotExist:
-                conn = conn_model(poll=poll, keypad=keypad)
-            conn.serial_number = vote['sn']
-            conn.value = value
-            if conn.pk:
-                # Save updated connection.
-                conn.save(skip_autoupdate=True)
-            else:
-                # Add new connection to bulk create list.
-                connections.append(conn)
-            keypad_set.add(keypad.id)
-
-        # Bulk create connections.
-        conn_model.objects.bulk_create(connections)
-
-        # Trigger auto update.
-        connections = conn_model.objects.filter(poll=poll, keypad_id__in=keypad_set)
-        inform_changed_data(connections)
+            valid_votes.append({'keypad': keypad.id, 'value': value, 'sn': vote['sn']})
 
+        # Save all votes at once.
+        store_votes(session.voting_mode, session.poll_id, valid_votes)
         return HttpResponse()
 
 
 class VoteCallback(VotingCallbackView):
-    @transaction.atomic
-    def post(self, request, poll_id, keypad_id):
-        keypad = super(VoteCallback, self).post(request, poll_id, keypad_id)
-        if keypad is None:
+    def post(self, request, keypad_id, poll_id=None, session=None):
+        keypad_pk = self.get_keypad_pk(request, keypad_id)
+        if keypad_pk is None:
             return HttpResponse(_('Vote rejected'))
 
         # Validate vote value.
@@ -520,40 +810,15 @@ class VoteCallback(VotingCallbackView):
         if value not in ('Y', 'N', 'A'):
             return HttpResponse(_('Vote invalid'))
 
-        # Save vote.
-        vc = VoteCollector.objects.get(id=1)
-        model = MotionPoll if vc.voting_mode == 'MotionPoll' else AssignmentPoll
-        try:
-            poll = model.objects.get(id=poll_id)
-        except model.DoesNotExist:
+        # Queue vote and update votecollector.
+        session = get_voting_session(session, poll_id)
+        if session is None:
             return HttpResponse(_('Vote rejected'))
-
-        if vc.voting_mode == 'MotionPoll':
-            try:
-                conn = MotionPollKeypadConnection.objects.get(poll=poll, keypad=keypad)
-            except MotionPollKeypadConnection.DoesNotExist:
-                conn = MotionPollKeypadConnection()
-                conn.poll = poll
-                conn.keypad = keypad
-            conn.serial_number = request.POST.get('sn')
-            conn.value = value
-            conn.save()
-
-        else:
-            try:
-                conn = AssignmentPollKeypadConnection.objects.get(poll=poll, keypad=keypad)
-            except AssignmentPollKeypadConnection.DoesNotExist:
-                conn = AssignmentPollKeypadConnection()
-                conn.poll = poll
-                conn.keypad = keypad
-            conn.serial_number = request.POST.get('sn')
-            conn.value = value
-            conn.save()
-
-        # Update votecollector.
-        vc.votes_received = request.POST.get('votes', 0)
-        vc.voting_duration = request.POST.get('elapsed', 0)
-        vc.save()
+        queue_votes(
+            session.voting_mode,
+            session.poll_id,
+            [{'keypad': keypad_pk, 'value': value, 'sn': request.POST.get('sn')}],
+            progress=(session.room_id, request.POST.get('votes', 0), request.POST.get('elapsed', 0)))
 
         return HttpResponse(_('Vote submitted'))
 
@@ -561,30 +826,26 @@ class VoteCallback(VotingCallbackView):
 class Candidates(utils_views.View):
     http_method_names = ['post']
 
-    @transaction.atomic()
-    def post(self, request, poll_id):
+    def post(self, request, poll_id=None, session=None):
         # Get assignment poll.
-        try:
-            poll = AssignmentPoll.objects.get(id=poll_id)
-        except AssignmentPoll.DoesNotExist:
+        session = get_voting_session(session, poll_id, 'AssignmentPoll')
+        if session is None or not session.poll_exists():
             return HttpResponse('')
 
         # Load json list from request body.
         votes = json.loads(request.body.decode('utf-8'))
-        candidate_count = poll.assignment.related_users.all().count()
-        keypad_set = set()
-        connections = []
+
+        # Resolve all keypads of this batch at once.
+        keypads = get_keypads_by_keypad_id(vote['id'] for vote in votes)
+        valid_votes = []
         for vote in votes:
-            keypad_id = vote['id']
             try:
-                keypad = Keypad.objects.get(keypad_id=keypad_id)
-            except Keypad.DoesNotExist:
+                keypad = keypads[vote['id']]
+            except KeyError:
                 continue
 
             # Mark keypad as in range and update battery level.
-            keypad.in_range = True
-            keypad.battery_level = vote['bl']
-            keypad.save(skip_autoupdate=True)
+            keypad_telemetry.add(keypad.keypad_id, vote['bl'])
 
             # Validate vote value.
             try:
@@ -596,48 +857,23 @@ class Candidates(utils_views.View):
                 continue
 
             # Get the selected candidate.
-            candidate_id = None
-            if 0 < value <= candidate_count:
-                candidate_id = AssignmentOption.objects.filter(
-                    poll=poll_id).order_by('weight').all()[value - 1].candidate_id
-
-            # Write poll connection.
-            try:
-                conn = AssignmentPollKeypadConnection.objects.get(poll=poll, keypad=keypad)
-            except AssignmentPollKeypadConnection.DoesNotExist:
-                conn = AssignmentPollKeypadConnection(poll=poll, keypad=keypad)
-            conn.serial_number = vote['sn']
-            conn.value = str(value)
-            conn.candidate_id = candidate_id
-            if conn.pk:
-                # Save updated connection.
-                conn.save(skip_autoupdate=True)
-            else:
-                # Add new connection to bulk create list.
-                connections.append(conn)
-            keypad_set.add(keypad.id)
-
-        # Bulk create connections.
-        AssignmentPollKeypadConnection.objects.bulk_create(connections)
-
-        # Trigger auto update.
-        connections = AssignmentPollKeypadConnection.objects.filter(poll=poll, keypad_id__in=keypad_set)
-        inform_changed_data(connections)
+            candidate_id = candidate_index.get_candidate_id(session.poll_id, value)
+            valid_votes.append({'keypad': keypad.id, 'value': str(value), 'sn': vote['sn'], 'candidate': candidate_id})
 
+        # Save all votes at once.
+        store_votes(session.voting_mode, session.poll_id, valid_votes)
         return HttpResponse()
 
 
 class CandidateCallback(VotingCallbackView):
-    @transaction.atomic()
-    def post(self, request, poll_id, keypad_id):
-        keypad = super(CandidateCallback, self).post(request, poll_id, keypad_id)
-        if keypad is None:
+    def post(self, request, keypad_id, poll_id=None, session=None):
+        keypad_pk = self.get_keypad_pk(request, keypad_id)
+        if keypad_pk is None:
             return HttpResponse(_('Vote rejected'))
 
         # Get assignment poll.
-        try:
-            poll = AssignmentPoll.objects.get(id=poll_id)
-        except AssignmentPoll.DoesNotExist:
+        session = get_voting_session(session, poll_id, 'AssignmentPoll')
+        if session is None:
             return HttpResponse(_('Vote rejected'))
 
         # Validate vote value.
@@ -649,27 +885,14 @@ class CandidateCallback(VotingCallbackView):
             return HttpResponse(_('Vote invalid'))
 
         # Get the elected candidate.
-        candidate = None
-        if key > 0 and key <= poll.assignment.related_users.all().count():
-            candidate = AssignmentOption.objects.filter(poll=poll_id).order_by('weight').all()[key - 1].candidate
+        candidate_id = candidate_index.get_candidate_id(session.poll_id, key)
 
-        # Save vote.
-        try:
-            conn = AssignmentPollKeypadConnection.objects.get(poll=poll, keypad=keypad)
-        except AssignmentPollKeypadConnection.DoesNotExist:
-            conn = AssignmentPollKeypadConnection()
-            conn.poll = poll
-            conn.keypad = keypad
-        conn.serial_number = request.POST.get('sn')
-        conn.value = str(key)
-        conn.candidate = candidate
-        conn.save()
-
-        # Update votecollector.
-        vc = VoteCollector.objects.get(id=1)
-        vc.votes_received = request.POST.get('votes', 0)
-        vc.voting_duration = request.POST.get('elapsed', 0)
-        vc.save()
+        # Queue vote and update votecollector.
+        queue_votes(
+            session.voting_mode,
+            session.poll_id,
+            [{'keypad': keypad_pk, 'value': str(key), 'sn': request.POST.get('sn'), 'candidate': candidate_id}],
+            progress=(session.room_id, request.POST.get('votes', 0), request.POST.get('elapsed', 0)))
 
         return HttpResponse(_('Vote submitted'))
 
@@ -726,30 +949,17 @@ class Keypads(utils_views.View):
     def post(self, request):
         # Load json list from request body.
         votes = json.loads(request.body.decode('utf-8'))
-        keypads = []
         for vote in votes:
-            keypad_id = vote['id']
-            try:
-                keypad = Keypad.objects.get(keypad_id=keypad_id)
-            except Keypad.DoesNotExist:
-                continue
-
-            # Mark keypad as in range and update battery level.
-            keypad.in_range = True
-            keypad.battery_level = vote['bl']
-            keypad.save(skip_autoupdate=True)
-            keypads.append(keypad)
-
-        # Trigger auto-update.
-        inform_changed_data(keypads)
+            # Mark keypad as in range and update battery level. The buffer
+            # triggers one auto update for all keypads.
+            keypad_telemetry.add(vote['id'], vote['bl'])
 
         return HttpResponse()
 
 
 class KeypadCallback(VotingCallbackView):
-    @transaction.atomic()
     def post(self, request, poll_id=0, keypad_id=0):
-        keypad = super(KeypadCallback, self).post(request, poll_id, keypad_id)
-        if keypad:
-            inform_changed_data(keypad)
+        # Mark keypad as in range and update battery level. Unknown keypads
+        # are dropped when the buffer is written.
+        keypad_telemetry.add(keypad_id, request.POST.get('battery', -1))
         return HttpResponse()
@@ -0,0 +1,233 @@
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from openslides.assignments.models import AssignmentPoll
+from openslides.motions.models import MotionPoll
+
+from .buffers import autoupdate_buffer, voting_progress
+from .cache import connection_index
+from .models import AssignmentPollKeypadConnection, Keypad, MotionPollKeypadConnection
+from .utils import bulk_update
+
+# Poll and connection models by voting mode (see VoteCollector.voting_mode).
+POLL_MODELS = {
+    'MotionPoll': (MotionPoll, MotionPollKeypadConnection),
+    'AssignmentPoll': (AssignmentPoll, AssignmentPollKeypadConnection),
+}
+
+# Keys of the vote dictionaries for the fields of the connections.
+VOTE_KEYS = {
+    'serial_number': 'sn',
+    'value': 'value',
+    'candidate': 'candidate',
+    'voted_at': 'voted_at',
+}
+
+# Maximum number of rows per upsert statement.
+UPSERT_CHUNK_SIZE = 1000
+
+
+def get_connections_by_keypad(conn_model, poll_id, keypad_ids):
+    """
+    Returns a dict of all existing connections of the poll for the given
+    keypad database ids. The keys are the database ids of the keypads.
+
+    If the poll is indexed (see ConnectionIndex), the connections are built
+    from the known connection ids without a query. Only their id, poll and
+    keypad are set then. Else one query is used.
+    """
+    keypad_ids = list(keypad_ids)
+    connection_ids = connection_index.get_connection_ids(conn_model, poll_id, keypad_ids)
+    if connection_ids is None:
+        queryset = conn_model.objects.filter(poll_id=poll_id, keypad__in=keypad_ids)
+        return {conn.keypad_id: conn for conn in queryset}
+    return {
+        keypad_id: conn_model(pk=connection_ids[keypad_id], poll_id=poll_id, keypad_id=keypad_id)
+        for keypad_id in keypad_ids if connection_ids[keypad_id]}
+
+
+def index_connections(conn_model, poll_id, connections):
+    """
+    Adds the given connections to the connection index and schedules
+    writing the live tally after the current transaction is committed.
+    """
+    connections = [(conn.keypad_id, conn.pk) for conn in connections]
+
+    def update_index():
+        connection_index.add(conn_model, poll_id, connections)
+        # Write the tally of all processes (see VotingProgressBuffer).
+        voting_progress.touch()
+    transaction.on_commit(update_index)
+
+
+def supports_upsert():
+    """
+    Returns True if the database can insert or update rows and return them
+    with one statement (INSERT ... ON CONFLICT ... RETURNING).
+    """
+    if connection.vendor == 'postgresql':
+        return connection.pg_version >= 90500
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35, 0)
+    return False
+
+
+def upsert_connections(conn_model, poll_id, votes, fields):
+    """
+    Inserts or updates the connections of the votes with one statement per
+    chunk using the unique constraint of poll and keypad. Returns the
+    connections.
+    """
+    quote_name = connection.ops.quote_name
+    model_fields = [conn_model._meta.get_field(field) for field in fields]
+    columns = ['poll_id', 'keypad_id'] + [field.column for field in model_fields]
+    concrete_fields = conn_model._meta.concrete_fields
+    sql = 'INSERT INTO %s (%s) VALUES %%s ON CONFLICT (%s) DO UPDATE SET %s RETURNING %s' % (
+        quote_name(conn_model._meta.db_table),
+        ', '.join(quote_name(column) for column in columns),
+        ', '.join(quote_name(column) for column in columns[:2]),
+        ', '.join('%s = EXCLUDED.%s' % (quote_name(column), quote_name(column)) for column in columns[2:]),
+        ', '.join(quote_name(field.column) for field in concrete_fields))
+    row = '(%s)' % ', '.join(['%s'] * len(columns))
+
+    votes = list(votes.items())
+    connections = []
+    with connection.cursor() as cursor:
+        for start in range(0, len(votes), UPSERT_CHUNK_SIZE):
+            chunk = votes[start:start + UPSERT_CHUNK_SIZE]
+            params = []
+            for keypad_id, vote in chunk:
+                params.extend([poll_id, keypad_id] + [
+                    model_field.get_db_prep_value(vote.get(VOTE_KEYS[field]), connection)
+                    for field, model_field in zip(fields, model_fields)])
+            cursor.execute(sql % ', '.join([row] * len(chunk)), params)
+            connections.extend(
+                conn_model.from_db(connection.alias, [field.attname for field in concrete_fields], values)
+                for values in cursor.fetchall())
+    return connections
+
+
+def update_or_create_connections(conn_model, poll_id, votes, fields, connections):
+    """
+    Updates the given connections and creates the missing ones with one
+    query each. Returns False without creating connections if some of the
+    given connections do not exist anymore, e. g. because they were taken
+    from an outdated connection index.
+    """
+    for keypad_id, vote in votes.items():
+        conn = connections.get(keypad_id)
+        if conn is None:
+            conn = connections[keypad_id] = conn_model(poll_id=poll_id, keypad_id=keypad_id)
+        for field in fields:
+            setattr(conn, conn_model._meta.get_field(field).attname, vote.get(VOTE_KEYS[field]))
+    existing = [conn for conn in connections.values() if conn.pk is not None]
+    if bulk_update(conn_model, existing, fields) != len(existing):
+        return False
+    conn_model.objects.bulk_create(conn for conn in connections.values() if conn.pk is None)
+    return True
+
+
+def get_voted_at(vote, default):
+    """
+    Returns the time of the vote from its timestamp t (seconds since the
+    epoch, see journal.py) or default.
+    """
+    if 't' not in vote:
+        return default
+    return datetime.fromtimestamp(vote['t'], timezone.utc)
+
+
+def get_newer_votes(conn_model, poll_id, votes):
+    """
+    Returns the votes which are newer than the stored votes of their
+    keypads and locks the stored votes. Used when the journal of a stopped
+    process is replayed while other processes write new votes.
+    """
+    stored = dict(conn_model.objects.select_for_update().filter(
+        poll_id=poll_id, keypad_id__in=set(vote['keypad'] for vote in votes)).values_list('keypad_id', 'voted_at'))
+    return [
+        vote for vote in votes
+        if stored.get(vote['keypad']) is None or 't' not in vote or
+        stored[vote['keypad']] <= get_voted_at(vote, None)]
+
+
+@transaction.atomic
+def save_votes(conn_model, poll_id, votes):
+    """
+    Writes the votes of one poll with a fixed number of queries, updates
+    the live tally and triggers one auto update. On PostgreSQL and recent
+    SQLite versions all votes are written with one upsert statement.
+
+    votes is a list of dictionaries with keypad (database id), value, sn
+    and for elections candidate (candidate id or None). If a keypad voted
+    several times, its last vote wins.
+    """
+    now = timezone.now()
+    votes = {vote['keypad']: dict(vote, voted_at=get_voted_at(vote, now)) for vote in votes}
+    if not votes:
+        return []
+    with_candidates = conn_model is AssignmentPollKeypadConnection and any(
+        'candidate' in vote for vote in votes.values())
+    fields = ('serial_number', 'value', 'voted_at')
+    if with_candidates:
+        fields += ('candidate',)
+
+    if supports_upsert():
+        connections = upsert_connections(conn_model, poll_id, votes, fields)
+    else:
+        try:
+            with transaction.atomic():
+                written = update_or_create_connections(
+                    conn_model, poll_id, votes, fields, get_connections_by_keypad(conn_model, poll_id, votes.keys()))
+        except IntegrityError:
+            written = False
+        if not written:
+            # A concurrent request created or deleted a connection of one
+            # of the keypads. Load and lock the connections again.
+            update_or_create_connections(conn_model, poll_id, votes, fields, {
+                conn.keypad_id: conn
+                for conn in conn_model.objects.select_for_update().filter(
+                    poll_id=poll_id, keypad_id__in=votes.keys())})
+        connections = list(conn_model.objects.filter(poll_id=poll_id, keypad_id__in=votes.keys()))
+
+    # Update the connection index and the live tally and trigger auto update.
+    index_connections(conn_model, poll_id, connections)
+    autoupdate_buffer.add(connections)
+    return connections
+
+
+def apply_entries(entries, only_newer=False):
+    """
+    Writes votes of the journal or the vote queue to the database. Every
+    entry is a vote like for save_votes with the voting mode and the poll
+    id. Entries are grouped by poll, so that every poll is written with a
+    fixed number of queries. Votes of deleted polls and keypads are dropped.
+    If only_newer is True, votes older than the stored ones are dropped too.
+    """
+    groups = OrderedDict()
+    for entry in entries:
+        groups.setdefault((entry['mode'], entry['poll'], 'candidate' in entry), []).append(entry)
+    keypad_ids = set(Keypad.objects.filter(
+        pk__in=set(entry['keypad'] for entry in entries)).values_list('pk', flat=True))
+
+    for (voting_mode, poll_id, __), votes in groups.items():
+        poll_model, conn_model = POLL_MODELS[voting_mode]
+        if not poll_model.objects.filter(pk=poll_id).exists():
+            continue
+        votes = [vote for vote in votes if vote['keypad'] in keypad_ids]
+        with transaction.atomic():
+            if only_newer:
+                votes = get_newer_votes(conn_model, poll_id, votes)
+            save_votes(conn_model, poll_id, votes)
+
+    # Update the voting progress of every room with the latest status of
+    # the device. Entries without a room come from the default room.
+    rooms = set()
+    for entry in reversed(entries):
+        room_id = entry.get('room', 1)
+        if 'votes' in entry and room_id not in rooms:
+            rooms.add(room_id)
+            voting_progress.add(room_id, entry['votes'], entry['elapsed'])